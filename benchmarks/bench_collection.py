@@ -0,0 +1,87 @@
+# Copyright 2020 Kapil Thangavelu
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark collection of test modules using the terraform decorator.
+
+Generates test modules with a decorated test per module reference, and
+times collection (`pytest --collect-only`) at increasing test counts,
+the time per test should stay flat as the count grows.
+
+    python benchmarks/bench_collection.py --tests 1000 2000 4000 8000
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+TestsPerFile = 100
+
+TestTemplate = """
+@terraform("module_{module}", replay=True)
+def test_{index}(module_{module}):
+    pass
+"""
+
+
+def generate(root, tests, modules):
+    for file_index in range(0, tests, TestsPerFile):
+        lines = ["from pytest_terraform import terraform\n"]
+        for index in range(file_index, min(tests, file_index + TestsPerFile)):
+            lines.append(TestTemplate.format(index=index, module=index % modules))
+        with open(os.path.join(root, "test_gen_%d.py" % file_index), "w") as fh:
+            fh.write("".join(lines))
+    for module in range(modules):
+        module_dir = os.path.join(root, "terraform", "module_%d" % module)
+        os.makedirs(module_dir)
+        with open(os.path.join(module_dir, "tf_resources.json"), "w") as fh:
+            fh.write('{"resources": {}, "outputs": {}}')
+
+
+def collect(root):
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", "pytest", "--collect-only", "-q", "--tf-replay"],
+        cwd=root,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--tests", type=int, nargs="+", default=[1000, 2000, 4000])
+    parser.add_argument("--modules", type=int, default=500)
+    options = parser.parse_args()
+
+    results = []
+    for tests in options.tests:
+        with tempfile.TemporaryDirectory() as root:
+            generate(root, tests, min(options.modules, tests))
+            elapsed = collect(root)
+        results.append(
+            {
+                "tests": tests,
+                "seconds": round(elapsed, 3),
+                "ms_per_test": round(elapsed * 1000 / tests, 3),
+            }
+        )
+    print(json.dumps({"benchmark": "collection", "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
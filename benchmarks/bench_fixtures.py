@@ -0,0 +1,142 @@
+# Copyright 2020 Kapil Thangavelu
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark per fixture overhead of the plugin against a fake terraform.
+
+For each state size, times fixture create and teardown, excluding the
+time spent in terraform (the fake binary) itself, loading a recording
+for replay, and resource access by name and by jmespath expression.
+
+    python benchmarks/bench_fixtures.py --sizes 10 100 1000 10000 > results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import fake_terraform
+from py.path import local
+from pytest_terraform import tf
+
+
+class Hook:
+    def pytest_terraform_modify_state(self, tfstate):
+        pass
+
+
+class Config:
+    hook = Hook()
+
+
+class Request:
+    def addfinalizer(self, func):
+        pass
+
+
+class TimedRunner(tf.TerraformRunner):
+    # accumulates time spent running terraform commands
+    command_seconds = 0
+
+    def _run_cmd(self, args, output=None):
+        start = time.perf_counter()
+        try:
+            return super()._run_cmd(args, output)
+        finally:
+            TimedRunner.command_seconds += time.perf_counter() - start
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def bench_size(root, size, repeat):
+    os.environ["FAKE_TF_RESOURCES"] = str(size)
+    module_dir = local(root).join("module_%d" % size).ensure(dir=True)
+    fixture = tf.TerraformFixture(
+        tf_bin=tf.LazyTfBin,
+        plugin_cache=None,
+        scope="function",
+        tf_root_module=module_dir.basename,
+        test_dir=local(root),
+        replay=False,
+        teardown=tf.td.ON,
+        pytest_config=Config(),
+    )
+    result = {"resources": size}
+    create = teardown = 0
+    for i in range(repeat):
+        work_dir = local(root).join("work-%d-%d" % (size, i), "work")
+        fixture.runner = TimedRunner(
+            str(work_dir), module_dir=str(module_dir), tf_bin=tf.LazyTfBin.value
+        )
+        fixture.runner.stream_output = False
+        TimedRunner.command_seconds = 0
+        elapsed, api = timed(fixture.create, Request(), module_dir)
+        create += elapsed - TimedRunner.command_seconds
+        TimedRunner.command_seconds = 0
+        elapsed, _ = timed(fixture.tear_down)
+        teardown += elapsed - TimedRunner.command_seconds
+    result["create_overhead_ms"] = create * 1000 / repeat
+    result["teardown_overhead_ms"] = teardown * 1000 / repeat
+
+    recording = str(module_dir.join("tf_resources.json"))
+    result["recording_bytes"] = os.path.getsize(recording)
+    elapsed = sum(
+        timed(tf.TerraformTestApi.from_file, recording)[0] for i in range(repeat)
+    )
+    result["replay_load_ms"] = elapsed * 1000 / repeat
+
+    api = tf.TerraformTestApi.from_file(recording)
+    name = "r%d" % (size - 1)
+    rtype = fake_terraform.ResourceTypes[(size - 1) % len(fake_terraform.ResourceTypes)]
+    accesses = 100
+    # warm up, the first expression imports jmespath
+    api.get("%s.%s" % (rtype, name))
+    elapsed = sum(timed(api.get, name)[0] for i in range(accesses))
+    result["get_name_us"] = elapsed * 1e6 / accesses
+    expr = "%s.%s.arn" % (rtype, name)
+    elapsed = sum(timed(api.get, expr)[0] for i in range(accesses))
+    result["get_jmespath_us"] = elapsed * 1e6 / accesses
+    return {k: round(v, 3) if isinstance(v, float) else v for k, v in result.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        tf.LazyTfBin.value = fake_terraform.install(os.path.join(root, "bin"))
+        results = [bench_size(root, size, options.repeat) for size in options.sizes]
+    print(
+        json.dumps(
+            {
+                "benchmark": "fixtures",
+                "python": platform.python_version(),
+                "argv": sys.argv[1:],
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# Copyright 2020 Kapil Thangavelu
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark xdist coordination of session scoped fixtures.
+
+Generates a suite of tests spread over session scoped fixtures backed
+by the fake terraform binary, runs it at several worker counts with
+--tf-trace, and summarizes the trace:
+
+- lock wait: time workers spent waiting on fixture create locks
+- log overhead: time spent writing and reading the completed test log
+- teardown latency: time from the last dependent test finishing to the
+  fixture's teardown finishing
+- idle: worker time not spent running test phases
+
+    python benchmarks/bench_xdist.py --workers 2 8 32 --tests 2000 --fixtures 20
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import fake_terraform
+
+TestsPerFile = 100
+
+# fixtures are defined once in a conftest, for use by all test modules
+FixtureTemplate = """
+terraform("module_{module}", scope="session", replay=False)
+"""
+
+TestTemplate = """
+def test_{index}(module_{module}):
+    assert module_{module}.outputs
+"""
+
+
+def generate(root, tests, fixtures):
+    """write the test suite, returns module name -> test node ids"""
+    # conftests of the invocation dir and its test* dirs are imported
+    # before the plugin is configured.
+    root = os.path.join(root, "suite")
+    os.makedirs(root)
+    dependents = defaultdict(list)
+    for file_index in range(0, tests, TestsPerFile):
+        name = "test_gen_%d.py" % file_index
+        lines = []
+        for index in range(file_index, min(tests, file_index + TestsPerFile)):
+            module = index % fixtures
+            lines.append(TestTemplate.format(index=index, module=module))
+            dependents["module_%d" % module].append("suite/%s::test_%d" % (name, index))
+        with open(os.path.join(root, name), "w") as fh:
+            fh.write("".join(lines))
+    lines = ["from pytest_terraform import terraform\n"]
+    for module in range(fixtures):
+        lines.append(FixtureTemplate.format(module=module))
+        os.makedirs(os.path.join(root, "terraform", "module_%d" % module))
+    with open(os.path.join(root, "conftest.py"), "w") as fh:
+        fh.write("".join(lines))
+    return dependents
+
+
+def run(root, workers, tf_bin):
+    trace_path = os.path.join(root, "trace-%d.jsonl" % workers)
+    start = time.perf_counter()
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "pytest",
+            "-q",
+            "-p",
+            "no:cacheprovider",
+            "-n",
+            str(workers),
+            "--tf-binary=%s" % tf_bin,
+            "--tf-plugin-dir=",
+            "--tf-trace=%s" % trace_path,
+        ],
+        cwd=root,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    elapsed = time.perf_counter() - start
+    with open(trace_path) as fh:
+        events = [json.loads(line) for line in fh]
+    os.remove(trace_path)
+    return elapsed, events
+
+
+def summarize(events, dependents):
+    lock_wait = log_read = log_write = 0
+    test_end = {}
+    test_time = defaultdict(float)
+    worker_span = {}
+    teardowns = {}
+    for e in events:
+        if e["event"] == "lock_wait":
+            lock_wait += e["duration"]
+        elif e["event"] == "log_read":
+            log_read += e["duration"]
+        elif e["event"] == "log_write":
+            log_write += e["duration"]
+        elif e["event"] == "test":
+            test_time[e["wid"]] += e["duration"]
+            if e["when"] == "call":
+                test_end[e["nodeid"]] = e["ts"]
+        elif e["event"] == "teardown":
+            teardowns[e["fixture"]] = e["ts"]
+        elif e["event"] in ("worker_start", "worker_finish"):
+            worker_span.setdefault(e["wid"], {})[e["event"]] = e["ts"]
+
+    latencies = []
+    for fixture, finished in teardowns.items():
+        last = max(test_end.get(n, 0) for n in dependents[fixture])
+        latencies.append(finished - last)
+    idle = 0
+    for wid, span in worker_span.items():
+        if len(span) == 2:
+            idle += span["worker_finish"] - span["worker_start"] - test_time[wid]
+    return {
+        "lock_wait_seconds": lock_wait,
+        "log_write_seconds": log_write,
+        "log_read_seconds": log_read,
+        "teardowns": len(latencies),
+        "teardown_latency_max_seconds": max(latencies, default=0),
+        "teardown_latency_mean_seconds": latencies
+        and sum(latencies) / len(latencies)
+        or 0,
+        "idle_worker_seconds": idle,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 8, 32])
+    parser.add_argument("--tests", type=int, default=2000)
+    parser.add_argument("--fixtures", type=int, default=20)
+    parser.add_argument("--resources", type=int, default=10)
+    options = parser.parse_args()
+
+    os.environ["FAKE_TF_RESOURCES"] = str(options.resources)
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        tf_bin = fake_terraform.install(os.path.join(root, "bin"))
+        dependents = generate(root, options.tests, options.fixtures)
+        for workers in options.workers:
+            elapsed, events = run(root, workers, tf_bin)
+            result = {"workers": workers, "seconds": elapsed}
+            result.update(summarize(events, dependents))
+            results.append({k: round(v, 3) for k, v in result.items()})
+    print(
+        json.dumps(
+            {
+                "benchmark": "xdist",
+                "tests": options.tests,
+                "fixtures": options.fixtures,
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
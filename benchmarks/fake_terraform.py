@@ -0,0 +1,116 @@
+# Copyright 2020 Kapil Thangavelu
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""A fake terraform binary for benchmarking the plugin's own overhead.
+
+Emulates the commands the plugin runs, without providers or network.
+apply writes a synthetic state of FAKE_TF_RESOURCES resources (default
+10), optionally sleeping FAKE_TF_APPLY_SECONDS first.
+
+install() writes an executable wrapper usable as --tf-binary.
+"""
+
+import json
+import os
+import stat
+import sys
+import time
+
+ResourceTypes = ("aws_sqs_queue", "aws_sns_topic", "aws_iam_role", "aws_s3_bucket")
+
+
+def synthetic_state(count):
+    resources = []
+    for i in range(count):
+        rtype = ResourceTypes[i % len(ResourceTypes)]
+        name = "r%d" % i
+        resources.append(
+            {
+                "mode": "managed",
+                "type": rtype,
+                "name": name,
+                "provider": 'provider["registry.terraform.io/hashicorp/aws"]',
+                "instances": [
+                    {
+                        "schema_version": 0,
+                        "attributes": {
+                            "id": "%s-%d" % (rtype, i),
+                            "arn": "arn:aws:sqs:us-east-1:123456789012:%s" % name,
+                            "name": name,
+                            "tags": {"Environment": "benchmark", "Index": str(i)},
+                            "policy": json.dumps(
+                                {"Version": "2012-10-17", "Statement": []}
+                            ),
+                        },
+                    }
+                ],
+            }
+        )
+    return {
+        "version": 4,
+        "terraform_version": "1.5.0",
+        "serial": 1,
+        "lineage": "fake",
+        "outputs": {"count": {"value": count, "type": "number"}},
+        "resources": resources,
+    }
+
+
+def option(args, prefix):
+    for a in args:
+        if a.startswith(prefix):
+            return a[len(prefix) :]
+
+
+def main(args):
+    command = args and args[0] or ""
+    if command == "version":
+        json.dump({"terraform_version": "1.5.0", "platform": "linux_amd64"}, sys.stdout)
+    elif command == "init":
+        os.makedirs(os.environ.get("TF_DATA_DIR", ".terraform"), exist_ok=True)
+    elif command == "plan":
+        plan = option(args, "-out=")
+        if plan:
+            with open(plan, "w") as fh:
+                fh.write("fake plan")
+    elif command == "apply":
+        time.sleep(float(os.environ.get("FAKE_TF_APPLY_SECONDS", 0)))
+        state = synthetic_state(int(os.environ.get("FAKE_TF_RESOURCES", 10)))
+        with open(os.path.normpath(option(args, "-state=")), "w") as fh:
+            json.dump(state, fh)
+    elif command == "destroy":
+        state_path = os.path.normpath(option(args, "-state="))
+        if os.path.exists(state_path):
+            os.remove(state_path)
+    elif command == "show":
+        with open(args[-1]) as fh:
+            state = json.load(fh)
+        json.dump({"format_version": "1.0", "values": state}, sys.stdout)
+    else:
+        print("fake terraform: unsupported command %s" % command, file=sys.stderr)
+        return 1
+    return 0
+
+
+def install(directory):
+    """write an executable wrapper running this module, returns its path"""
+    os.makedirs(str(directory), exist_ok=True)
+    path = os.path.join(str(directory), "terraform")
+    with open(path, "w") as fh:
+        fh.write('#!/bin/sh\nexec "%s" "%s" "$@"\n' % (sys.executable, __file__))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
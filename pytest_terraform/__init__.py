@@ -12,7 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-__all__ = ["terraform", "teardown"]
+__all__ = ["register_backend", "teardown", "terraform"]
 
+from .backends import register_backend
 from .options import teardown
 from .tf import terraform
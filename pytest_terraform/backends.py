@@ -0,0 +1,63 @@
+# Copyright 2020 Kapil Thangavelu
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Registry of runner backends.
+
+A runner backend is a class constructed like TerraformRunner, ie.
+
+    backend(work_dir, module_dir=..., plugin_cache=..., tf_bin=..., **kw)
+
+providing `init()`, `apply() -> TerraformState` and `destroy()`, along
+with `work_dir` and `state_path` attributes. Subclassing TerraformRunner
+is the easiest way to provide one.
+"""
+
+import importlib
+
+from .exceptions import InvalidOption
+
+DefaultBackend = "subprocess"
+# backends shipped with the plugin, imported on first use
+BuiltinBackends = {"snapshot": "pytest_terraform.snapshot"}
+DefaultSnapshotDir = ".tfsnapshots"
+
+_backends = {}
+
+
+def register_backend(name, runner_class=None):
+    """register a runner backend class by name, usable as a class decorator"""
+
+    def register(runner_class):
+        _backends[name] = runner_class
+        return runner_class
+
+    if runner_class is None:
+        return register
+    return register(runner_class)
+
+
+def get_backend(name=None):
+    name = name or DefaultBackend
+    if name not in _backends and name in BuiltinBackends:
+        importlib.import_module(BuiltinBackends[name])
+    if name not in _backends:
+        raise InvalidOption(
+            "{} is not a valid backend: {}".format(name, ",".join(sorted(_backends)))
+        )
+    return _backends[name]
+
+
+def get_backends():
+    for module in BuiltinBackends.values():
+        importlib.import_module(module)
+    return dict(_backends)
@@ -0,0 +1,202 @@
+# Copyright 2020 Kapil Thangavelu
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import re
+import shutil
+import tempfile
+
+from .disk import dir_size
+from .lock import LockTimeout
+from .report import report
+
+LockFile = ".terraform.lock.hcl"
+LockProviderRe = re.compile(
+    r'provider\s+"(?P<address>[^"]+)"\s*\{[^}]*?version\s*=\s*"(?P<version>[^"]+)"'
+)
+
+# terraform's plugin cache layout, ie.
+# registry.terraform.io/hashicorp/local/2.4.0/linux_amd64
+ProviderDepth = 5
+CheckInterval = 1
+
+
+class PluginCache:
+    """A terraform provider plugin cache shared by all fixtures.
+
+    terraform doesn't coordinate concurrent writes to its plugin cache,
+    so population (ie. init) is serialized with a file lock, which
+    covers xdist workers as well as concurrent sessions. modules whose
+    locked providers are all cached don't write to it, and init without
+    the lock.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+
+    @property
+    def lock_path(self):
+        return os.path.join(self.path, ".lock")
+
+    def lock(self, timeout=LockTimeout):
+        import portalocker
+
+        os.makedirs(self.path, exist_ok=True)
+        return portalocker.Lock(
+            self.lock_path, timeout=timeout, check_interval=CheckInterval
+        )
+
+    def providers(self, root=None):
+        """return the set of cached provider platform directories
+
+        as paths relative to the root, ie. host/namespace/type/version/platform
+        """
+        root = root or self.path
+        found = set()
+        if not os.path.isdir(root):
+            return found
+        for dirpath, dirnames, _ in os.walk(root, followlinks=True):
+            rel = os.path.relpath(dirpath, root)
+            depth = rel != "." and rel.count(os.sep) + 1 or 0
+            if depth == ProviderDepth:
+                found.add(rel)
+                dirnames[:] = []
+        return found
+
+    def warm(self, module_dir):
+        """whether the providers of a module's dependency lock file are cached"""
+        lock_path = os.path.join(str(module_dir), LockFile)
+        if not os.path.exists(lock_path):
+            return False
+        with open(lock_path) as fh:
+            locked = LockProviderRe.findall(fh.read())
+        for address, version in locked:
+            path = os.path.join(self.path, *address.split("/"), version)
+            if not (os.path.isdir(path) and os.listdir(path)):
+                return False
+        return True
+
+    def record_init(self, before, data_dir):
+        """record cache hits and misses of a module's provider installation
+
+        before is the set of cached providers prior to init, and data_dir
+        the module's terraform data directory.
+        """
+        installed = self.providers(os.path.join(data_dir, "providers"))
+        hits = installed.intersection(before)
+        for p in hits:
+            # track usage for eviction
+            os.utime(os.path.join(self.path, p))
+        report.add("plugin cache", "hits", len(hits))
+        report.add("plugin cache", "misses", len(installed) - len(hits))
+
+    def evict(self, max_size):
+        """remove least recently used provider versions over max_size bytes
+
+        the most recently used version of each provider is always kept.
+        """
+        versions = {}
+        for p in self.providers():
+            path = os.path.join(self.path, p)
+            versions.setdefault(os.path.dirname(os.path.dirname(p)), []).append(
+                (os.path.getmtime(path), dir_size(path), path)
+            )
+        total = sum(v[1] for pv in versions.values() for v in pv)
+        candidates = []
+        for pv in versions.values():
+            pv.sort()
+            candidates.extend(pv[:-1])
+        candidates.sort()
+
+        evicted = 0
+        for _, size, path in candidates:
+            if total <= max_size:
+                break
+            shutil.rmtree(path)
+            total -= size
+            evicted += size
+        if evicted:
+            report.add("plugin cache", "evicted bytes", evicted)
+        return evicted
+
+
+class ProviderMirror:
+    """A filesystem provider mirror used for init via -plugin-dir.
+
+    the mirror is populated once per session for all discovered modules,
+    from their dependency lock files. modules whose locked providers are
+    already mirrored are skipped, such that a prepopulated mirror never
+    needs registry access.
+    """
+
+    def __init__(self, path, discover=None):
+        self.path = str(path)
+        self.discover = discover
+        self.platform = None
+        self.built = False
+
+    def ensure(self, runner):
+        """populate the mirror, using runner's terraform binary"""
+        if self.built:
+            return
+        import portalocker
+
+        os.makedirs(self.path, exist_ok=True)
+        with portalocker.Lock(
+            os.path.join(self.path, ".lock"),
+            timeout=LockTimeout,
+            check_interval=CheckInterval,
+        ):
+            for module_dir in self.discover and self.discover() or ():
+                self.mirror_module(runner, str(module_dir))
+        self.built = True
+
+    def mirror_module(self, runner, module_dir):
+        if self.platform is None:
+            self.platform = runner.version()["platform"]
+        lock_path = os.path.join(module_dir, LockFile)
+        if os.path.exists(lock_path) and not self.missing(lock_path):
+            return
+        # a data dir of its own, not the fixture's work dir
+        data_dir = tempfile.mkdtemp(prefix="tf-mirror-")
+        try:
+            mirror_runner = runner.__class__(
+                os.path.join(data_dir, "work"),
+                module_dir=module_dir,
+                tf_bin=runner.tf_bin,
+                stream_output=runner.stream_output,
+            )
+            mirror_runner.mirror_providers(self.path, self.platform)
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+        report.add("provider mirror", "mirrored modules")
+
+    def missing(self, lock_path):
+        """return locked providers not present in the mirror"""
+        with open(lock_path) as fh:
+            locked = LockProviderRe.findall(fh.read())
+        missing = []
+        for address, version in locked:
+            ptype = address.rsplit("/", 1)[-1]
+            packed = os.path.join(
+                self.path,
+                *address.split("/"),
+                f"terraform-provider-{ptype}_{version}_{self.platform}.zip",
+            )
+            unpacked = os.path.join(
+                self.path, *address.split("/"), version, self.platform
+            )
+            if not (os.path.exists(packed) or os.path.isdir(unpacked)):
+                missing.append((address, version))
+        return missing
@@ -0,0 +1,145 @@
+# Copyright 2020 Kapil Thangavelu
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Composite provisioning of function scoped fixtures.
+
+When a test requests several composite enabled, function scoped
+fixtures, the first one requested provisions all of them together
+via a generated wrapper root module which calls each fixture's module
+as a child module. That's a single init/apply/destroy process chain
+instead of one per fixture. The resulting state is split back into
+per fixture values by module address.
+
+Fixtures are only grouped with ones of the same teardown mode, as the
+group is torn down as a whole. Member outputs are re-exported through a
+single sensitive object output, their types are taken from that object's
+type and their sensitivity from the module's output declarations.
+"""
+
+import json
+import os
+import re
+
+import pytest
+
+from pytest_terraform import tf
+
+composite_key = pytest.StashKey[dict]()
+
+SensitiveOutput = re.compile(
+    r'output\s+"([^"]+)"\s*\{[^}]*?\bsensitive\s*=\s*true\b', re.DOTALL
+)
+
+
+class CompositeTerraformFixture(tf.TerraformFixture):
+    # function scoped fixture, provisioned together with the other
+    # composite fixtures requested by the same test.
+
+    def __call__(self, request, tmpdir_factory, worker_id):
+        if self.replay:
+            return super().__call__(request, tmpdir_factory, worker_id)
+        provisioned = request.node.stash.setdefault(composite_key, {})
+        if self.name not in provisioned:
+            group = resolve_group(self, request)
+            if len(group) == 1:
+                return super().__call__(request, tmpdir_factory, worker_id)
+            provisioned.update(provision(self, group, request, tmpdir_factory))
+        return provisioned.pop(self.name)
+
+
+def resolve_group(fixture, request):
+    """return the composite fixtures requested with fixture, fixture first
+
+    only fixtures of the same teardown mode as fixture are grouped, the
+    others are provisioned in groups of their own.
+    """
+    group = [fixture]
+    for name in request.fixturenames:
+        try:
+            f = tf.terraform.get_fixture(name)
+        except KeyError:
+            continue
+        if (
+            f is not fixture
+            and isinstance(f, CompositeTerraformFixture)
+            and not f.replay
+            and f.teardown_config == fixture.teardown_config
+        ):
+            group.append(f)
+    return group
+
+
+def sensitive_outputs(module_dir):
+    """return the names of the outputs a module declares as sensitive"""
+    names = set()
+    for fname in os.listdir(module_dir):
+        path = os.path.join(module_dir, fname)
+        if fname.endswith(".tf.json"):
+            with open(path) as fh:
+                outputs = json.load(fh).get("output", {})
+            names.update(k for k, v in outputs.items() if v.get("sensitive"))
+        elif fname.endswith(".tf"):
+            with open(path) as fh:
+                names.update(SensitiveOutput.findall(fh.read()))
+    return names
+
+
+def render_wrapper(fixtures):
+    """render the wrapper root module as terraform json"""
+    modules = {}
+    outputs = {}
+    for f in fixtures:
+        modules[f.name] = {"source": str(f.resolve_module_dir())}
+        # child module outputs are only in state if re-exported.
+        outputs[f.name] = {"value": f"${{module.{f.name}}}", "sensitive": True}
+    return json.dumps({"module": modules, "output": outputs}, indent=2)
+
+
+def provision(fixture, group, request, tmpdir_factory):
+    """provision a composite group led by fixture, returns name -> test api
+
+    the wrapper module is written within the leader's work dir, such that
+    it's journaled, and pruned, along with it.
+    """
+    work_dir = fixture.make_work_dir(tmpdir_factory)
+    wrapper_dir = tf.local(work_dir).join("module").ensure(dir=True)
+    wrapper_dir.join("main.tf.json").write(render_wrapper(group))
+    tf.write_log(
+        "tf composite create {}".format(", ".join(f.tf_root_module for f in group))
+    )
+
+    fixture._projection = None
+    fixture.runner = runner = fixture.get_runner(str(wrapper_dir), work_dir)
+    state = fixture.provision(request, wrapper_dir)
+    return {f.name: split_state(f, state, runner) for f in group}
+
+
+def split_state(fixture, state, runner):
+    """record and return a fixture's view of the composite state"""
+    projection = fixture.get_projection()
+    fstate = tf.TerraformState.from_file(
+        runner.state_path, runner, projection, module=f"module.{fixture.name}"
+    )
+    fixture.report_projection(projection)
+    module_dir = fixture.resolve_module_dir()
+    output = state.outputs.get(fixture.name, {})
+    # an object type is ["object", {attribute: type}]
+    otype = output.get("type")
+    types = otype[1] if isinstance(otype, list) and len(otype) == 2 else {}
+    sensitive = sensitive_outputs(str(module_dir))
+    fstate.outputs = {}
+    for k, v in (output.get("value") or {}).items():
+        fstate.outputs[k] = {"value": v, "sensitive": k in sensitive}
+        if k in types:
+            fstate.outputs[k]["type"] = types[k]
+    return fixture.record(fstate, module_dir)
@@ -0,0 +1,121 @@
+# Copyright 2020 Kapil Thangavelu
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Dependency graph of fixtures declared with `depends_on`.
+
+The graph is a dict of pytest fixture name -> names of its upstream
+fixtures.
+"""
+
+from .exceptions import InvalidOption
+
+
+class DependencyFailed(Exception):
+    """an upstream fixture failed, the fixture wasn't run"""
+
+
+def graph(fixtures):
+    """return the dependency graph of fixtures"""
+    return {f.fixture_name: tuple(f.depends_on) for f in fixtures}
+
+
+def reverse(deps):
+    """return the graph with edges reversed, ie. name -> dependents"""
+    dependents = {name: [] for name in deps}
+    for name, upstream in deps.items():
+        for u in upstream:
+            dependents.setdefault(u, []).append(name)
+    return {name: tuple(d) for name, d in dependents.items()}
+
+
+def subgraph(deps, names):
+    """return the graph of only the given names"""
+    names = set(names)
+    return {
+        name: tuple(u for u in upstream if u in names)
+        for name, upstream in deps.items()
+        if name in names
+    }
+
+
+def order(deps):
+    """return names in topological order, upstream before dependents
+
+    raises InvalidOption on unknown upstream names or cycles.
+    """
+    ordered = []
+    state = {}
+
+    def visit(name, path):
+        if state.get(name) == "done":
+            return
+        if state.get(name) == "visiting":
+            raise InvalidOption(
+                "terraform fixture dependency cycle: {}".format(
+                    " -> ".join(path[path.index(name) :] + [name])
+                )
+            )
+        if name not in deps:
+            raise InvalidOption(
+                f"terraform fixture {path[-1]} depends on unknown fixture {name}"
+            )
+        state[name] = "visiting"
+        for u in deps[name]:
+            visit(u, path + [name])
+        state[name] = "done"
+        ordered.append(name)
+
+    for name in deps:
+        visit(name, [])
+    return ordered
+
+
+def run(deps, func, workers):
+    """call func for each name concurrently, after its upstream succeeded
+
+    func is called with the name and a dict of its upstream names to
+    their return values. returns (results, errors), dicts of name ->
+    func's return value or the exception raised. names whose upstream
+    failed aren't called, their error is a DependencyFailed.
+    """
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    order(deps)
+    results = {}
+    errors = {}
+    pending = dict(deps)
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            for name, upstream in list(pending.items()):
+                failed = [u for u in upstream if u in errors]
+                if failed:
+                    errors[name] = DependencyFailed(
+                        "{} skipped, upstream failed: {}".format(name, ", ".join(failed))
+                    )
+                    del pending[name]
+                elif all(u in results for u in upstream):
+                    future = pool.submit(func, name, {u: results[u] for u in upstream})
+                    running[future] = name
+                    del pending[name]
+            if not running:
+                # every pending name's upstream failed, on the next pass
+                continue
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                if future.exception() is None:
+                    results[name] = future.result()
+                else:
+                    errors[name] = future.exception()
+    return results, errors
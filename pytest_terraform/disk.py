@@ -0,0 +1,61 @@
+# Copyright 2020 Kapil Thangavelu
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Disk usage of terraform work dirs.
+
+Work dirs are measured once applied, symlinks (ie. providers linked
+from the plugin cache) aren't counted. The peak is the largest total
+size of live work dirs, ie. applied and not yet pruned, within this
+process.
+"""
+
+import os
+import threading
+
+from .report import report
+
+
+def dir_size(path):
+    """return the size in bytes of the files under path, excluding symlinks"""
+    size = 0
+    for dirpath, _, filenames in os.walk(path):
+        for f in filenames:
+            fpath = os.path.join(dirpath, f)
+            if not os.path.islink(fpath):
+                size += os.path.getsize(fpath)
+    return size
+
+
+class WorkDirUsage:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sizes = {}
+        self.peak = 0
+
+    def add(self, path):
+        size = dir_size(path)
+        with self.lock:
+            self.sizes[path] = size
+            total = sum(self.sizes.values())
+            report.add("work dirs", "bytes written", size)
+            if total > self.peak:
+                # the report is additive, add the increase of the peak
+                report.add("work dirs", "peak bytes", total - self.peak)
+                self.peak = total
+
+    def remove(self, path):
+        with self.lock:
+            self.sizes.pop(path, None)
+
+
+usage = WorkDirUsage()
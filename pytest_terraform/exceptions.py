@@ -5,6 +5,29 @@ class PytestTerraformError(Exception):
 class TerraformCommandFailed(PytestTerraformError):
     """Terraform Command failed during execution"""
 
+    @classmethod
+    def from_process_error(cls, error):
+        """create from a CalledProcessError, including its output tail"""
+        cmd = error.cmd
+        if not isinstance(cmd, str):
+            cmd = " ".join(map(str, cmd))
+        timeout = getattr(error, "timeout", None)
+        error_class = cls
+        if timeout:
+            error_class = TerraformCommandTimeout
+            msg = f"terraform command timed out after {timeout:g}s: {cmd}"
+        else:
+            msg = f"terraform command failed with exit code {error.returncode}: {cmd}"
+        if error.output:
+            msg += "\n--- output tail ---\n{}".format(
+                error.output.decode("utf8", "replace")
+            )
+        return error_class(msg)
+
+
+class TerraformCommandTimeout(TerraformCommandFailed):
+    """Terraform command timed out"""
+
 
 class InvalidOption(PytestTerraformError):
     """Invalid Option Error"""
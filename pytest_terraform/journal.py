@@ -0,0 +1,198 @@
+# Copyright 2020 Kapil Thangavelu
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Durable journal of provisioned fixtures.
+
+The journal lives outside of pytest's basetemp, and holds the work dirs
+of journaled fixtures along with an entry per work dir, ie.
+
+    .tfjournal/work/aws_sqs-k2j3h4/work
+    .tfjournal/entries/aws_sqs-k2j3h4.json
+
+entries record the module, work dir, state path, owning process and a
+status of `applying`, `applied` or `destroying`, and are removed once
+the module is destroyed. entries are replaced atomically, so a process
+killed at any point leaves either the previous or the next entry.
+
+entries whose owning process is gone are leftovers of a crashed run,
+those of an intact apply of an unchanged module can be adopted by a
+later run in place of provisioning, the rest are destroyed by reap.
+"""
+
+import json
+import os
+import socket
+import subprocess
+import tempfile
+
+from .exceptions import TerraformCommandFailed
+from .lock import LockTimeout
+from .report import report
+
+DefaultReapWorkers = 8
+
+
+class Journal:
+    def __init__(self, path):
+        self.path = os.path.abspath(str(path))
+        self.entries_dir = os.path.join(self.path, "entries")
+        self.work_root = os.path.join(self.path, "work")
+        self.host = socket.gethostname()
+
+    def work_dir(self, name):
+        """allocate a durable work dir for a module"""
+        os.makedirs(self.work_root, exist_ok=True)
+        return os.path.join(
+            tempfile.mkdtemp(prefix=f"{name}-", dir=self.work_root), "work"
+        )
+
+    def journaled(self, work_dir):
+        return os.path.dirname(os.path.dirname(str(work_dir))) == self.work_root
+
+    def entry_path(self, work_dir):
+        return os.path.join(
+            self.entries_dir, os.path.basename(os.path.dirname(str(work_dir))) + ".json"
+        )
+
+    def write(self, runner, module, status):
+        """record the status of a journaled runner's module"""
+        if not self.journaled(runner.work_dir):
+            return
+        from .snapshot import module_digest
+
+        entry = {
+            "module": module,
+            "module_dir": str(runner.module_dir),
+            "work_dir": str(runner.work_dir),
+            "state_path": os.path.normpath(runner.state_path),
+            "digest": module_digest(str(runner.module_dir)),
+            "status": status,
+            "host": self.host,
+            "pid": os.getpid(),
+        }
+        os.makedirs(self.entries_dir, exist_ok=True)
+        self._write_entry(entry)
+
+    def _write_entry(self, entry):
+        path = self.entry_path(entry["work_dir"])
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as fh:
+            json.dump(entry, fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, path)
+
+    def remove(self, work_dir):
+        try:
+            os.remove(self.entry_path(work_dir))
+        except FileNotFoundError:
+            pass
+
+    def entries(self):
+        if not os.path.isdir(self.entries_dir):
+            return []
+        entries = []
+        for name in sorted(os.listdir(self.entries_dir)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.entries_dir, name)) as fh:
+                    entries.append(json.load(fh))
+            except (FileNotFoundError, ValueError):
+                continue
+        return entries
+
+    def leftovers(self):
+        """return entries whose owning process is gone"""
+        return [e for e in self.entries() if not self.alive(e)]
+
+    def alive(self, entry):
+        # processes on other hosts can't be checked, assume they're running
+        if entry["host"] != self.host:
+            return True
+        if entry["pid"] == os.getpid():
+            return True
+        try:
+            os.kill(entry["pid"], 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def adopt(self, module, module_dir):
+        """claim a leftover intact apply of module, returns its entry or None"""
+        import portalocker
+
+        from .snapshot import module_digest
+
+        if not os.path.isdir(self.entries_dir):
+            return None
+        digest = module_digest(str(module_dir))
+        with portalocker.Lock(os.path.join(self.path, ".lock"), timeout=LockTimeout):
+            for entry in self.leftovers():
+                if (
+                    entry["module"] != module
+                    or entry["module_dir"] != str(module_dir)
+                    or entry["status"] != "applied"
+                    or entry["digest"] != digest
+                    or not intact(entry["state_path"])
+                ):
+                    continue
+                entry.update(pid=os.getpid(), host=self.host)
+                self._write_entry(entry)
+                report.add("journal", "adopted")
+                return entry
+        return None
+
+    def reap(self, runner_factory, workers=DefaultReapWorkers):
+        """destroy all leftovers, returns a list of (work dir, error) failures
+
+        runner_factory is called with a leftover entry and returns a
+        runner for its work dir.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        leftovers = self.leftovers()
+        failures = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                (e, pool.submit(self._reap_entry, runner_factory(e), e))
+                for e in leftovers
+            ]
+            for entry, future in futures:
+                error = future.exception()
+                if isinstance(error, subprocess.CalledProcessError):
+                    error = TerraformCommandFailed.from_process_error(error)
+                if error is not None:
+                    failures.append((entry["work_dir"], error))
+        report.add("journal", "reaped", len(leftovers) - len(failures))
+        report.add("journal", "reap failed", len(failures))
+        return failures
+
+    def _reap_entry(self, runner, entry):
+        self.write(runner, entry["module"], "destroying")
+        # the data dir of a crashed init or apply may be incomplete
+        runner.init()
+        runner.destroy()
+        self.remove(runner.work_dir)
+
+
+def intact(state_path):
+    """whether a state file exists and parses"""
+    try:
+        with open(state_path) as fh:
+            json.load(fh)
+    except (OSError, ValueError):
+        return False
+    return True
@@ -0,0 +1,197 @@
+# Copyright 2020 Kapil Thangavelu
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Incremental json parsing from a file handle.
+
+Terraform state files for large root modules can be substantial, a
+JsonCursor lets us walk the document structure as it streams off the
+file handle, materializing only the values we actually keep. Values
+that are read in full are decoded by the stdlib's c accelerated
+decoder directly from the read buffer.
+"""
+
+import codecs
+import json
+import re
+
+BufferSize = 64 * 1024
+Whitespace = " \t\n\r"
+
+# the end of a number or literal
+_ScalarEnd = re.compile(r"[\s,\]}]")
+# characters which open or close a value, outside of strings
+_Structural = re.compile(r'["{}\[\]]')
+# characters which end or escape within a string
+_StringSpecial = re.compile(r'["\\]')
+
+
+class JsonCursor:
+    """Pull parser over a text or binary json stream.
+
+    Containers are walked with `iter_map` / `iter_array`, for every key
+    or index yielded the caller must consume the value, with either
+    `read_value`, `skip`, or a nested iteration. `skip` scans over a
+    value without decoding it.
+    """
+
+    def __init__(self, fh, bufsize=BufferSize):
+        self.fh = fh
+        self.bufsize = bufsize
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self._decoder = json.JSONDecoder()
+        self._bytes_decoder = None
+
+    def peek(self):
+        """return the next significant character, or '' at end of stream"""
+        while True:
+            buf, pos = self.buf, self.pos
+            while pos < len(buf) and buf[pos] in Whitespace:
+                pos += 1
+            self.pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self._fill():
+                return ""
+
+    def iter_map(self):
+        self._expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            if self.peek() != '"':
+                raise self._error("expected object key")
+            key = self.read_value()
+            self._expect(":")
+            yield key
+            c = self.peek()
+            self.pos += 1
+            if c == "}":
+                return
+            if c != ",":
+                raise self._error("expected , or }")
+
+    def iter_array(self):
+        self._expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        idx = 0
+        while True:
+            yield idx
+            idx += 1
+            c = self.peek()
+            self.pos += 1
+            if c == "]":
+                return
+            if c != ",":
+                raise self._error("expected , or ]")
+
+    def read_value(self):
+        """materialize the next value"""
+        c = self.peek()
+        if not c:
+            raise self._error("unexpected end of document")
+        if c not in '{["':
+            # a number or literal split across reads, ie. at a . or e,
+            # would otherwise decode as its leading part.
+            self._scalar_end()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill(len(self.buf) - self.pos):
+                    continue
+                raise self._error("invalid or truncated value")
+            self.pos = end
+            return value
+
+    def skip(self):
+        """consume the next value without decoding it"""
+        c = self.peek()
+        if not c:
+            raise self._error("unexpected end of document")
+        if c not in '{["':
+            self.pos = self._scalar_end()
+            return
+        depth = 0
+        while True:
+            m = _Structural.search(self.buf, self.pos)
+            if m is None:
+                self.pos = len(self.buf)
+                self._fill_or_fail()
+                continue
+            self.pos = m.end()
+            if m.group() == '"':
+                self._skip_string()
+            elif m.group() in "{[":
+                depth += 1
+            else:
+                depth -= 1
+            if depth == 0:
+                return
+
+    def _skip_string(self):
+        while True:
+            m = _StringSpecial.search(self.buf, self.pos)
+            if m is None:
+                self.pos = len(self.buf)
+                self._fill_or_fail()
+            elif m.group() == '"':
+                self.pos = m.end()
+                return
+            elif m.end() == len(self.buf):
+                # keep the escape for the next chunk's escaped character
+                self.pos = m.start()
+                self._fill_or_fail()
+            else:
+                self.pos = m.end() + 1
+
+    def _scalar_end(self):
+        """return the end of the scalar at pos, reading until it's delimited"""
+        while True:
+            m = _ScalarEnd.search(self.buf, self.pos)
+            if m is not None:
+                return m.start()
+            if not self._fill():
+                return len(self.buf)
+
+    def _expect(self, c):
+        if self.peek() != c:
+            raise self._error(f"expected {c}")
+        self.pos += 1
+
+    def _fill(self, min_size=0):
+        """read another chunk into the buffer, returns False at end of stream"""
+        if self.eof:
+            return False
+        chunk = self.fh.read(max(self.bufsize, min_size))
+        if not chunk:
+            self.eof = True
+            return False
+        if isinstance(chunk, bytes):
+            if self._bytes_decoder is None:
+                self._bytes_decoder = codecs.getincrementaldecoder("utf8")()
+            chunk = self._bytes_decoder.decode(chunk)
+        self.buf = self.buf[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def _fill_or_fail(self):
+        if not self._fill():
+            raise self._error("invalid or truncated value")
+
+    def _error(self, msg):
+        return ValueError(f"{msg} at offset {self.pos}")
@@ -14,7 +14,6 @@
 
 import contextlib
 
-import portalocker
 from py.path import local
 
 PollInterval = 5
@@ -29,6 +28,8 @@ def lock_create(file_path, timeout=LockTimeout, interval=PollInterval):
         - (false, file_content)
         - (true, file_handle)
     """
+    import portalocker
+
     fp = local(file_path)
     if fp.exists():
         yield False, fp.read_text("utf8")
@@ -54,6 +55,8 @@ def lock_delete(file_path, timeout=LockTimeout, interval=PollInterval):
       - False if file didn't exist
       - True if file will be deleted
     """
+    import portalocker
+
     pointer = local(file_path)
     if not pointer.exists():
         yield False
@@ -0,0 +1,67 @@
+# Copyright 2020 Kapil Thangavelu
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Index of module directories and their recordings.
+
+Module roots (the module dir option, and the directories around test
+files) are each scanned once, subsequent module lookups are dict
+lookups without filesystem access. Recordings are only checked for
+existence, not read. The manifest is only used by replay runs.
+"""
+
+import os
+from collections import namedtuple
+
+RecordingName = "tf_resources.json"
+
+ModuleEntry = namedtuple("ModuleEntry", "name module_dir recording")
+
+
+def scan_root(root):
+    """return module name -> ModuleEntry for the directories under root"""
+    entries = {}
+    try:
+        children = list(os.scandir(root))
+    except (FileNotFoundError, NotADirectoryError):
+        return entries
+    for child in children:
+        if not child.is_dir():
+            continue
+        recording = os.path.join(child.path, RecordingName)
+        if not os.path.exists(recording):
+            recording = None
+        entries[child.name] = ModuleEntry(child.name, child.path, recording)
+    return entries
+
+
+class ReplayManifest:
+    def __init__(self):
+        self.roots = {}
+
+    def add_root(self, root):
+        root = os.path.abspath(str(root))
+        if root not in self.roots:
+            self.roots[root] = scan_root(root)
+        return self.roots[root]
+
+    def lookup(self, roots, name):
+        """return the entry for name in the first root containing it, or None"""
+        for root in roots:
+            entry = self.add_root(root).get(name)
+            if entry is not None:
+                return entry
+        return None
+
+    def entries(self):
+        for entries in self.roots.values():
+            yield from entries.values()
@@ -1,4 +1,4 @@
-from .exceptions import InvalidTeardownMode
+from .exceptions import InvalidOption, InvalidTeardownMode
 
 
 class TeardownOption:
@@ -37,3 +37,21 @@ class TeardownOption:
 
 
 teardown = TeardownOption()
+
+
+def parse_timeouts(value):
+    """parse command timeouts, ie. `600` or `default=600,apply=1800,destroy=900`
+
+    returns a dict of terraform command name (or `default`) to seconds.
+    """
+    timeouts = {}
+    for part in filter(None, (p.strip() for p in (value or "").split(","))):
+        name, _, seconds = part.rpartition("=")
+        try:
+            seconds = float(seconds)
+        except ValueError:
+            seconds = 0
+        if seconds <= 0:
+            raise InvalidOption(f"{part} is not a valid command timeout")
+        timeouts[name.strip() or "default"] = seconds
+    return timeouts
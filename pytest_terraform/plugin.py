@@ -12,11 +12,22 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import shutil
+import os
 from collections import defaultdict
 
 import pytest
-from pytest_terraform import hooks, tf, xdist
+
+from pytest_terraform import composite, dag, hooks, record, tf
+from pytest_terraform.backends import DefaultSnapshotDir
+from pytest_terraform.cache import PluginCache, ProviderMirror
+from pytest_terraform.exceptions import InvalidOption
+from pytest_terraform.journal import Journal
+from pytest_terraform.manifest import ReplayManifest
+from pytest_terraform.options import parse_timeouts
+from pytest_terraform.redact import Redactor
+from pytest_terraform.report import report
+from pytest_terraform.retry import DefaultTransientPatterns, RetryPolicy
+from pytest_terraform.trace import tracer
 
 
 @pytest.hookimpl(trylast=True)
@@ -26,22 +37,32 @@ def pytest_configure(config):
     cache_dir = config.getoption("dest_tf_plugin")
 
     if cache_dir:
-        pass
+        tf.LazyPluginCacheDir.value = os.path.abspath(cache_dir)
+
+    mirror_dir = config.getoption("dest_tf_provider_mirror") or config.getini(
+        "terraform-provider-mirror"
+    )
+    if mirror_dir:
+        tf.LazyProviderMirror.value = ProviderMirror(
+            os.path.abspath(mirror_dir), discover=discover_module_dirs
+        )
 
     tf.LazyModuleDir.value = config.getoption("dest_tf_mod_dir") or config.getini(
         "terraform-mod-dir"
     )
-
     if tf.LazyReplay.value is None:
         tf.LazyReplay.value = config.getoption("dest_tf_replay")
 
-    tf.LazyTfBin.value = (
-        config.getoption("dest_tf_binary")
-        or shutil.which("tofu")
-        or shutil.which("terraform")
-    )
+    # replay runs resolve modules and recordings from an index of the roots
+    tf.LazyManifest.value = None
+    if tf.LazyReplay.value:
+        tf.LazyManifest.value = ReplayManifest()
+        if tf.LazyModuleDir.value:
+            tf.LazyManifest.value.add_root(tf.LazyModuleDir.value)
 
-    if tf.LazyTfBin.value is None and not tf.LazyReplay.value:
+    # replay runs look up the binary on path only if a fixture records
+    tf.LazyTfBin.value = config.getoption("dest_tf_binary")
+    if not tf.LazyReplay.value and tf.discover_tf_bin() is None:
         raise ValueError(
             "pytest-terraform requires terraform binary on PATH or "
             "specified with --tf-binary"
@@ -49,8 +70,63 @@ def pytest_configure(config):
 
     tf.PytestConfig.value = config
     tf.LazyTFDebug.value = config.getoption("dest_tf_debug") or False
+    tf.LazyProjection.value = config.getini("terraform-projection")
+    tf.LazyComposite.value = config.getini("terraform-composite")
+    tf.terraform.composite_class = composite.CompositeTerraformFixture
+    tf.LazyBackend.value = config.getoption("dest_tf_backend") or config.getini(
+        "terraform-backend"
+    )
+    tf.LazySnapshotDir.value = config.getini("terraform-snapshot-dir")
+    tf.LazyRedactor.value = Redactor(config.getini("terraform-redact"))
+    tf.LazyVolatileKeys.value = tf.key_matcher(
+        config.getini("terraform-volatile-keys") or tf.DefaultVolatileKeys
+    )
+    tf.LazyParallelism.value = config.getoption("dest_tf_parallelism") or (
+        config.getini("terraform-parallelism") or None
+    )
+    tf.LazyTimeouts.value = parse_timeouts(
+        config.getoption("dest_tf_timeout") or config.getini("terraform-timeout")
+    )
+    retries = config.getoption("dest_tf_retries")
+    if retries is None:
+        retries = int(config.getini("terraform-retries"))
+    if retries:
+        tf.LazyRetryPolicy.value = RetryPolicy(
+            config.getini("terraform-retry-patterns") or DefaultTransientPatterns,
+            attempts=retries,
+        )
+    tf.LazyFastDestroy.value = config.getoption("dest_tf_fast_destroy") or config.getini(
+        "terraform-fast-destroy"
+    )
+    tf.LazyKeepWorkDirs.value = config.getoption(
+        "dest_tf_keep_work_dirs"
+    ) or config.getini("terraform-keep-work-dirs")
+    tf.LazyBreakLockFile.value = config.getoption(
+        "dest_tf_plugin_cache_break_lock_file"
+    ) or config.getini("terraform-plugin-cache-break-lock-file")
+
+    journal_dir = config.getoption("dest_tf_journal") or config.getini(
+        "terraform-journal"
+    )
+    if journal_dir:
+        tf.LazyJournal.value = Journal(journal_dir)
+
+    if config.getoption("dest_tf_record_only") and config.getoption("numprocesses", None):
+        raise pytest.UsageError("--tf-record-only runs its own pool, without xdist")
+    if config.getoption("dest_tf_reap"):
+        if not journal_dir:
+            raise pytest.UsageError("--tf-reap requires a journal, see --tf-journal")
+        if config.getoption("numprocesses", None):
+            raise pytest.UsageError("--tf-reap runs its own pool, without xdist")
+
+    trace_path = config.getoption("dest_tf_trace")
+    if trace_path:
+        wid = getattr(config, "workerinput", {}).get("workerid", "master")
+        tracer.open(os.path.abspath(trace_path), wid)
+
+    if is_distributed(config):
+        from pytest_terraform import xdist
 
-    if config.pluginmanager.hasplugin("xdist"):
         config.pluginmanager.register(xdist.XDistTerraform(config))
         tf.terraform.scope_class_map = d = defaultdict(
             lambda: xdist.ScopedTerraformFixture
@@ -58,6 +134,134 @@ def pytest_configure(config):
         d["function"] = tf.TerraformFixture
 
 
+def is_distributed(config):
+    """whether this is an xdist controller or worker process"""
+    if not config.pluginmanager.hasplugin("xdist"):
+        return False
+    if hasattr(config, "workerinput"):
+        return True
+    return bool(config.getoption("numprocesses", None) or config.getoption("tx", None))
+
+
+def discover_module_dirs():
+    module_dirs = set()
+    for f in tf.terraform.get_fixtures():
+        try:
+            module_dirs.add(str(f.resolve_module_dir()))
+        except tf.ModuleNotFound:
+            continue
+    return sorted(module_dirs)
+
+
+record_failures_key = pytest.StashKey[list]()
+reap_failures_key = pytest.StashKey[list]()
+
+
+def pytest_collection_finish(session):
+    """validate fixture dependencies, and report replay fixtures of
+    collected tests which lack a recording"""
+    config = session.config
+    try:
+        dag.order(dag.graph(tf.terraform.get_fixtures()))
+    except InvalidOption as e:
+        raise pytest.UsageError(str(e))
+    if config.getoption("dest_tf_record_only") or config.getoption("dest_tf_reap"):
+        return
+    used = set()
+    for item in session.items:
+        used.update(getattr(item, "fixturenames", ()))
+    missing = []
+    for f in tf.terraform.get_fixtures():
+        if not f.replay or f.name not in used:
+            continue
+        try:
+            if f.resolve_recording() is None:
+                missing.append(f"{f.name} (not recorded)")
+        except tf.ModuleNotFound:
+            missing.append(f"{f.name} (module not found)")
+    if missing:
+        raise pytest.UsageError(
+            "terraform replay recordings missing: {}".format(", ".join(sorted(missing)))
+        )
+
+
+def pytest_runtestloop(session):
+    """in record only mode, record all modules instead of running tests
+
+    and when reaping, destroy the journal's leftovers.
+    """
+    config = session.config
+    if config.getoption("dest_tf_reap"):
+        if not config.option.collectonly:
+            failures = tf.LazyJournal.value.reap(reap_runner)
+            config.stash[reap_failures_key] = failures
+            session.testsfailed = len(failures)
+        return True
+    if not config.getoption("dest_tf_record_only"):
+        return
+    if session.config.option.collectonly:
+        return True
+    failures = record.record_all(
+        tf.terraform.get_fixtures(),
+        config._tmp_path_factory,
+        config.getoption("dest_tf_record_workers"),
+    )
+    config.stash[record_failures_key] = failures
+    session.testsfailed = len(failures)
+    return True
+
+
+def reap_runner(entry):
+    """a runner for the work dir of a journal entry"""
+    return tf.TerraformRunner(
+        entry["work_dir"],
+        state_path=entry["state_path"],
+        module_dir=entry["module_dir"],
+        plugin_cache=tf.LazyPluginCacheDir.resolve(False),
+        tf_bin=tf.discover_tf_bin(),
+        stream_output=False,
+        fast_destroy=tf.LazyFastDestroy.resolve(False),
+        timeouts=tf.LazyTimeouts.resolve({}),
+        retry_policy=tf.LazyRetryPolicy.resolve(False),
+        prune=True,
+        break_lock_file=tf.LazyBreakLockFile.resolve(False),
+    )
+
+
+def pytest_sessionfinish(session):
+    config = session.config
+    cache_size = config.getoption("dest_tf_plugin_cache_size")
+    cache_dir = tf.LazyPluginCacheDir.resolve(False)
+    if not cache_size or not cache_dir or hasattr(config, "workerinput"):
+        return
+    if not os.path.isdir(cache_dir):
+        return
+    cache = PluginCache(cache_dir)
+    with cache.lock():
+        cache.evict(cache_size * 1024 * 1024)
+
+
+def pytest_unconfigure(config):
+    tracer.close()
+
+
+def pytest_terminal_summary(terminalreporter):
+    report.write(terminalreporter)
+    stash = terminalreporter.config.stash
+    for key, title in (
+        (record_failures_key, "terraform recording failures"),
+        (reap_failures_key, "terraform reap failures"),
+    ):
+        failures = stash.get(key, ())
+        if not failures:
+            continue
+        terminalreporter.write_sep("-", title)
+        for name, error in failures:
+            terminalreporter.write_line(
+                "{}: {}".format(name, str(error).split("\n", 1)[0] or repr(error))
+            )
+
+
 def pytest_addhooks(pluginmanager):
     """Register pytest_terraform hooks"""
     pluginmanager.add_hookspecs(hooks)
@@ -93,11 +297,220 @@ def pytest_addoption(parser):
         "--tf-plugin-dir",
         action="store",
         dest="dest_tf_plugin",
-        default=".tfcache",
         help=(
-            "[Depreceated] Use this directory for a terraform plugin cache "
-            "Default is to use .tfcache."
+            "Use this directory for a terraform plugin cache shared by all "
+            "fixtures, ie. .tfcache. Default is no cache."
+        ),
+    )
+    group.addoption(
+        "--tf-plugin-cache-size",
+        action="store",
+        type=int,
+        dest="dest_tf_plugin_cache_size",
+        help=(
+            "Evict least recently used provider versions from the plugin cache "
+            "at session end to stay under this size in MB."
+        ),
+    )
+    group.addoption(
+        "--tf-plugin-cache-break-lock-file",
+        action="store_true",
+        dest="dest_tf_plugin_cache_break_lock_file",
+        help=(
+            "Link cached providers into work dirs even when a module's lock "
+            "file lacks their checksums for this platform."
+        ),
+    )
+
+    group.addoption(
+        "--tf-provider-mirror",
+        action="store",
+        dest="dest_tf_provider_mirror",
+        help=(
+            "Build a filesystem provider mirror in this directory from the lock "
+            "files of all modules, and init modules only from it."
+        ),
+    )
+
+    group.addoption(
+        "--tf-backend",
+        action="store",
+        dest="dest_tf_backend",
+        help=(
+            "Runner backend used to execute terraform, one of the registered "
+            "backends. Default is subprocess."
+        ),
+    )
+
+    group.addoption(
+        "--tf-fast-destroy",
+        action="store_true",
+        dest="dest_tf_fast_destroy",
+        help=(
+            "Destroy without refresh at higher parallelism, and remove state of "
+            "purely local resources without running terraform."
+        ),
+    )
+
+    group.addoption(
+        "--tf-keep-work-dirs",
+        action="store_true",
+        dest="dest_tf_keep_work_dirs",
+        help="Keep terraform work dirs after teardown, instead of removing them.",
+    )
+
+    group.addoption(
+        "--tf-xdist-controller",
+        action="store_true",
+        dest="dest_tf_xdist_controller",
+        help=(
+            "Provision shared fixtures in the xdist controller, workers load "
+            "their state without running terraform."
+        ),
+    )
+
+    group.addoption(
+        "--tf-journal",
+        action="store",
+        dest="dest_tf_journal",
+        default=None,
+        help=(
+            "Directory of a durable journal of provisioned fixtures, whose "
+            "leftovers from crashed runs are adopted or reaped."
+        ),
+    )
+
+    group.addoption(
+        "--tf-reap",
+        action="store_true",
+        dest="dest_tf_reap",
+        help="Destroy leftover fixtures of the journal, instead of running tests.",
+    )
+
+    group.addoption(
+        "--tf-parallelism",
+        action="store",
+        dest="dest_tf_parallelism",
+        help=(
+            "Terraform -parallelism for apply, plan and destroy, an integer or "
+            "auto to derive it from the module's recording and xdist workers."
+        ),
+    )
+
+    group.addoption(
+        "--tf-timeout",
+        action="store",
+        dest="dest_tf_timeout",
+        help=(
+            "Terraform command timeouts in seconds, for all commands and/or per "
+            "command, ie. 600 or default=600,apply=1800,destroy=900"
         ),
     )
 
+    group.addoption(
+        "--tf-retries",
+        action="store",
+        type=int,
+        dest="dest_tf_retries",
+        default=None,
+        help=(
+            "Number of retries of apply and destroy failing with a transient "
+            "error. (default: 0, no retries)"
+        ),
+    )
+
+    group.addoption(
+        "--tf-record-only",
+        action="store_true",
+        dest="dest_tf_record_only",
+        help=(
+            "Provision, record and destroy all modules referenced by collected "
+            "tests, without running the tests."
+        ),
+    )
+
+    group.addoption(
+        "--tf-record-workers",
+        action="store",
+        type=int,
+        dest="dest_tf_record_workers",
+        default=record.DefaultWorkers,
+        help="Modules recorded concurrently in record only mode. "
+        f"(default: {record.DefaultWorkers})",
+    )
+
+    group.addoption(
+        "--tf-trace",
+        action="store",
+        dest="dest_tf_trace",
+        help="Append json lines of xdist coordination events to the given file.",
+    )
+
     parser.addini("terraform-mod-dir", "Parent Directory for terraform modules")
+    parser.addini(
+        "terraform-retries", "Retries of transient apply/destroy failures", default="0"
+    )
+    parser.addini(
+        "terraform-retry-patterns",
+        "Regular expressions matching transient errors in terraform output",
+        type="linelist",
+    )
+    parser.addini("terraform-timeout", "Terraform command timeouts in seconds")
+    parser.addini("terraform-parallelism", "Terraform -parallelism, an integer or auto")
+    parser.addini(
+        "terraform-fast-destroy",
+        "Destroy without refresh, skipping terraform for purely local resources",
+        type="bool",
+        default=False,
+    )
+    parser.addini(
+        "terraform-plugin-cache-break-lock-file",
+        "Link cached providers even when the lock file lacks their checksums",
+        type="bool",
+        default=False,
+    )
+    parser.addini(
+        "terraform-keep-work-dirs",
+        "Keep terraform work dirs after teardown",
+        type="bool",
+        default=False,
+    )
+    parser.addini(
+        "terraform-xdist-controller",
+        "Provision shared fixtures in the xdist controller",
+        type="bool",
+        default=False,
+    )
+    parser.addini(
+        "terraform-journal", "Directory of a durable journal of provisioned fixtures"
+    )
+    parser.addini("terraform-backend", "Runner backend used to execute terraform")
+    parser.addini(
+        "terraform-snapshot-dir",
+        "Directory for snapshot backend captures",
+        default=DefaultSnapshotDir,
+    )
+    parser.addini(
+        "terraform-composite",
+        "Provision function scoped fixtures requested by the same test together",
+        type="bool",
+        default=False,
+    )
+    parser.addini(
+        "terraform-provider-mirror", "Filesystem provider mirror directory for init"
+    )
+    parser.addini(
+        "terraform-redact",
+        "Redaction rules applied to recorded state, key:, path:, value: or pack:",
+        type="linelist",
+    )
+    parser.addini(
+        "terraform-volatile-keys",
+        "Globs of attribute keys whose values are kept from existing recordings",
+        type="linelist",
+    )
+    parser.addini(
+        "terraform-projection",
+        "Glob patterns over type.name.attribute selecting recorded resource attributes",
+        type="linelist",
+    )
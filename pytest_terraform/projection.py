@@ -0,0 +1,84 @@
+# Copyright 2020 Kapil Thangavelu
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import fnmatch
+import json
+import re
+
+
+class Projection:
+    """Select which resource attributes are kept from state.
+
+    patterns are globs over `type.name.attribute`, trailing segments
+    may be omitted and default to `*`. patterns prefixed with `!`
+    exclude matching attributes. when only exclusions are given all
+    other attributes are kept. the `id` attribute is always kept.
+
+    ie. ["aws_sqs_queue.*.url", "!*.*.policy"], a single pattern may
+    be given as a string.
+    """
+
+    def __init__(self, patterns=()):
+        self.includes = []
+        self.excludes = []
+        self.saved = 0
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        for p in patterns:
+            p = p.strip()
+            if not p:
+                continue
+            target = self.includes
+            if p.startswith("!"):
+                target, p = self.excludes, p[1:]
+            segments = (p.split(".", 2) + ["*", "*"])[:3]
+            target.append(tuple(re.compile(fnmatch.translate(s)).match for s in segments))
+
+    def __bool__(self):
+        return bool(self.includes or self.excludes)
+
+    def keep(self, rtype, rname, attr):
+        if attr == "id":
+            return True
+        key = (rtype, rname, attr)
+        if self.includes and not any(_match(p, key) for p in self.includes):
+            return False
+        return not any(_match(p, key) for p in self.excludes)
+
+    def apply(self, rtype, rname, attrs):
+        """return the projected attributes of a resource"""
+        if not self:
+            return attrs
+        projected = {}
+        for k, v in attrs.items():
+            if self.keep(rtype, rname, k):
+                projected[k] = v
+            else:
+                self.saved += len(json.dumps({k: v})) - 2
+        return projected
+
+    def apply_resources(self, resources):
+        """return a projected resource map, ie. type -> name -> attributes"""
+        if not self:
+            return resources
+        return {
+            rtype: {
+                rname: self.apply(rtype, rname, attrs) for rname, attrs in rmap.items()
+            }
+            for rtype, rmap in resources.items()
+        }
+
+
+def _match(pattern, key):
+    return all(m(k) for m, k in zip(pattern, key))
@@ -0,0 +1,91 @@
+# Copyright 2020 Kapil Thangavelu
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Bulk recording of all referenced modules, without running tests.
+
+Every module registered via the terraform decorator during collection
+is provisioned, recorded (including the modify state hook) and
+destroyed, concurrently with a bounded pool of threads. Modules are
+provisioned after their upstream fixtures (see `depends_on`), which
+are destroyed after all their dependents, in reverse topological order.
+"""
+
+import subprocess
+
+from pytest_terraform import dag, tf
+from pytest_terraform.report import report
+
+DefaultWorkers = 4
+
+
+def record_module(fixture, work_dir, upstream=None, kept=None):
+    """provision and record a module, tearing it down unless kept
+
+    when a kept list is given, the initialized fixture's name is added
+    to it in place of tearing it down.
+    """
+    module_dir = fixture.resolve_module_dir()
+    fixture._projection = fixture.get_projection()
+    fixture.upstream = upstream or {}
+    fixture.write_upstream(work_dir)
+    fixture.runner = runner = fixture.get_runner(module_dir, work_dir)
+    tf.write_log(f"tf record {fixture.name}")
+    runner.init()
+    if kept is not None:
+        kept.append(fixture.name)
+    try:
+        return fixture.record(runner.apply(), module_dir)
+    finally:
+        if kept is None:
+            tear_down_module(fixture)
+
+
+def tear_down_module(fixture):
+    # bypass xdist's coordinated teardown of scoped fixtures, each
+    # module is recorded exactly once here.
+    if fixture.teardown_config != tf.td.OFF:
+        tf.TerraformFixture.tear_down(fixture)
+
+
+def record_all(fixtures, tmp_path_factory, workers=DefaultWorkers):
+    """record fixtures' modules, returns a list of (name, error) failures"""
+    # temp dirs are allocated upfront, numbering isn't thread safe.
+    work_dirs = {
+        f.fixture_name: str(tmp_path_factory.mktemp(f.name, numbered=True) / "work")
+        for f in fixtures
+    }
+    by_name = {f.fixture_name: f for f in fixtures}
+    deps = dag.graph(fixtures)
+    dependents = dag.reverse(deps)
+    # modules with dependents are kept until those are recorded
+    kept = []
+
+    def provision(name, upstream):
+        keep = kept if dependents[name] else None
+        return record_module(by_name[name], work_dirs[name], upstream, keep)
+
+    def destroy(name, _):
+        tear_down_module(by_name[name])
+
+    _, errors = dag.run(deps, provision, workers)
+    _, destroy_errors = dag.run(dag.subgraph(dependents, kept), destroy, workers)
+    errors.update(destroy_errors)
+
+    failures = []
+    for name, e in sorted(errors.items()):
+        if isinstance(e, subprocess.CalledProcessError):
+            e = tf.TerraformCommandFailed.from_process_error(e)
+        failures.append((name, e))
+    report.add("record only", "recorded", len(fixtures) - len(failures))
+    report.add("record only", "failed", len(failures))
+    return failures
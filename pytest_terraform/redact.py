@@ -0,0 +1,147 @@
+# Copyright 2020 Kapil Thangavelu
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Redaction of recorded state.
+
+Rules are compiled once and applied in a single walk over the exported
+state dict, values are replaced in place of their strings such that
+the structure of the recording is preserved. Rules are one of
+
+- `key:<glob>` redact the values of any key matching the glob
+- `path:<a.b.c>` redact the value at a dotted key path from the root of
+  the recording, segments are globs, ie. `resources.aws_iam_role.*.arn`
+- `value:<regex>` replace matches of a regex within string values
+- `pack:<name>` a built-in set of value and key rules, see `RulePacks`
+
+values under a redacted key are replaced recursively, strings with
+`Redacted` and numbers with 0.
+"""
+
+import fnmatch
+import re
+import time
+
+from .exceptions import InvalidOption
+from .report import report
+
+Redacted = "REDACTED"
+
+RulePacks = {
+    # account ids in arns, service urls and ecr registries, and the values
+    # of account keys, rather than any 12 digit number.
+    "aws-account-ids": [
+        "pack:aws-arns",
+        (r"(amazonaws\.com/)\d{12}(?=/)", r"\g<1>000000000000"),
+        (r"(?<![\w.-])\d{12}(?=\.dkr\.ecr\.)", "000000000000"),
+        "key:owner_id",
+        "key:*account_id",
+    ],
+    "aws-arns": [(r"(arn:aws[\w-]*:[\w-]*:[\w-]*:)\d{12}(?=:)", r"\g<1>000000000000")],
+    # documentation addresses, rfc 5737
+    "ips": [(r"(?<![\d.])(?:\d{1,3}\.){3}\d{1,3}(?![\d.])", "192.0.2.0")],
+}
+
+
+class Redactor:
+    def __init__(self, rules=()):
+        keys = []
+        self.paths = []
+        self.values = []
+        rules = list(rules)
+        for rule in rules:
+            rule = rule.strip()
+            if not rule:
+                continue
+            kind, sep, arg = rule.partition(":")
+            if not sep or not arg:
+                raise InvalidOption(f"invalid redaction rule {rule!r}")
+            if kind == "key":
+                keys.append(fnmatch.translate(arg))
+            elif kind == "path":
+                self.paths.append(
+                    tuple(re.compile(fnmatch.translate(s)).match for s in arg.split("."))
+                )
+            elif kind == "value":
+                self.values.append((_compile(arg, rule), Redacted))
+            elif kind == "pack" and arg in RulePacks:
+                for entry in RulePacks[arg]:
+                    if isinstance(entry, str):
+                        rules.append(entry)
+                    else:
+                        self.values.append((_compile(entry[0], rule), entry[1]))
+            else:
+                raise InvalidOption(f"invalid redaction rule {rule!r}")
+        # all key globs as one alternation, a single match per key
+        self.keys = keys and re.compile("|".join(keys)).match or None
+
+    def __bool__(self):
+        return bool(self.keys or self.paths or self.values)
+
+    def redact(self, data):
+        """return a redacted copy of data, reporting the redaction stats
+
+        the redactor is shared across threads, values redacted are
+        counted per call.
+        """
+        start = time.perf_counter()
+        count = [0]
+        data = self._walk(data, 0, tuple(self.paths), count)
+        report.add("redaction", "values", count[0])
+        report.add("redaction", "seconds", time.perf_counter() - start)
+        return data
+
+    def _walk(self, node, depth, paths, count):
+        if isinstance(node, dict):
+            result = {}
+            for k, v in node.items():
+                matched = paths and [p for p in paths if p[depth](k)]
+                if (self.keys and self.keys(k)) or (
+                    matched and any(len(p) == depth + 1 for p in matched)
+                ):
+                    result[k] = self._redact_all(v, count)
+                    continue
+                if matched:
+                    matched = tuple(p for p in matched if len(p) > depth + 1)
+                result[k] = self._walk(v, depth + 1, matched or (), count)
+            return result
+        if isinstance(node, list):
+            # list indices aren't path segments
+            return [self._walk(v, depth, paths, count) for v in node]
+        if isinstance(node, str) and self.values:
+            return self._sub(node, count)
+        return node
+
+    def _sub(self, value, count):
+        for pattern, replacement in self.values:
+            value, n = pattern.subn(replacement, value)
+            count[0] += n
+        return value
+
+    def _redact_all(self, node, count):
+        if isinstance(node, dict):
+            return {k: self._redact_all(v, count) for k, v in node.items()}
+        if isinstance(node, list):
+            return [self._redact_all(v, count) for v in node]
+        if isinstance(node, bool) or node is None:
+            return node
+        count[0] += 1
+        if isinstance(node, str):
+            return Redacted
+        return 0
+
+
+def _compile(pattern, rule):
+    try:
+        return re.compile(pattern)
+    except re.error as e:
+        raise InvalidOption(f"invalid redaction rule {rule!r}: {e}")
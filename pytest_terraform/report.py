@@ -0,0 +1,71 @@
+# Copyright 2020 Kapil Thangavelu
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import glob
+import json
+import threading
+
+
+class SessionReport:
+    """Counters collected over a test session.
+
+    counters are grouped by section, ie. section -> key -> number, and
+    are summed when merged, such that xdist workers can dump their
+    counters for the controller to render in the terminal summary.
+    counters are added under a lock, as fixtures may provision from
+    several threads.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sections = {}
+
+    def __bool__(self):
+        return any(self.sections.values())
+
+    def add(self, section, key, value=1):
+        with self.lock:
+            counters = self.sections.setdefault(section, {})
+            counters[key] = counters.get(key, 0) + value
+
+    def get(self, section, key, default=0):
+        return self.sections.get(section, {}).get(key, default)
+
+    def merge(self, sections):
+        for section, counters in sections.items():
+            for key, value in counters.items():
+                self.add(section, key, value)
+
+    def dump(self, path):
+        with open(path, "w") as fh:
+            json.dump(self.sections, fh)
+
+    def load(self, pattern):
+        """merge counters from dumped reports matching a glob pattern"""
+        for path in sorted(glob.glob(str(pattern))):
+            with open(path) as fh:
+                self.merge(json.load(fh))
+
+    def write(self, terminalreporter):
+        if not self:
+            return
+        terminalreporter.write_sep("-", "terraform")
+        for section, counters in sorted(self.sections.items()):
+            for key, value in sorted(counters.items()):
+                if isinstance(value, float):
+                    value = f"{value:.2f}"
+                terminalreporter.write_line(f"{section}: {key} {value}")
+
+
+report = SessionReport()
@@ -0,0 +1,258 @@
+# Copyright 2020 Kapil Thangavelu
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compact resource storage for terraform state.
+
+Session scoped fixtures keep their state alive for the whole test run,
+in every xdist worker. Rather than nested dicts of attribute dicts,
+resources are held as slotted records with interned type and name
+strings, and attributes encoded as a compact json blob which is only
+decoded on access.
+
+The maps are dicts, a resource's attributes are decoded on first
+access and cached in place of its record, such that mutating them
+modifies the stored resource.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+from collections.abc import ItemsView, Mapping, ValuesView
+
+
+def encode_attributes(attrs):
+    return json.dumps(attrs, separators=(",", ":")).encode("utf8")
+
+
+def to_dict(resources):
+    if isinstance(resources, ResourceMap):
+        return resources.to_dict()
+    return resources
+
+
+class ResourceRecord:
+    __slots__ = ("blob", "name", "type")
+
+    def __init__(self, rtype, rname, blob):
+        self.type = sys.intern(rtype)
+        self.name = sys.intern(rname)
+        self.blob = blob
+
+    @property
+    def attributes(self):
+        # blobs may be memoryview slices of a mapped snapshot
+        return json.loads(bytes(self.blob))
+
+    def __repr__(self):
+        return f"<ResourceRecord {self.type}.{self.name}>"
+
+
+class ResourceTypeMap(dict):
+    """resource name -> attributes, for a single resource type
+
+    values are stored as records, and decoded on each access without
+    being kept, such that memory stays flat however much of the state is
+    read. changes to a resource are kept by assigning its attributes.
+    all reads go through __getitem__, overriding __iter__ also moves dict
+    copies and merges off the c fast path which would see the records.
+    """
+
+    __slots__ = ("type",)
+
+    def __init__(self, rtype, resources=None):
+        super().__init__()
+        self.type = sys.intern(rtype)
+        if resources:
+            self.update(resources)
+
+    def add_record(self, record):
+        dict.__setitem__(self, record.name, record)
+
+    def records(self):
+        return dict.values(self)
+
+    def __getitem__(self, name):
+        return dict.__getitem__(self, name).attributes
+
+    def __setitem__(self, name, attrs):
+        self.add_record(ResourceRecord(self.type, name, encode_attributes(attrs)))
+
+    def __iter__(self):
+        return dict.__iter__(self)
+
+    def get(self, name, default=None):
+        if name in self:
+            return self[name]
+        return default
+
+    def setdefault(self, name, default=None):
+        if name not in self:
+            self[name] = default
+        return self[name]
+
+    def pop(self, name, *default):
+        if name not in self and default:
+            return default[0]
+        value = self[name]
+        del self[name]
+        return value
+
+    def popitem(self):
+        name = next(reversed(self.keys()))
+        return name, self.pop(name)
+
+    def update(self, *args, **kw):
+        for name, attrs in dict(*args, **kw).items():
+            self[name] = attrs
+
+    def values(self):
+        return ValuesView(self)
+
+    def items(self):
+        return ItemsView(self)
+
+    def copy(self):
+        return self.to_dict()
+
+    def __eq__(self, other):
+        if not isinstance(other, Mapping):
+            return NotImplemented
+        return self.to_dict() == dict(other.items())
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return (self.__class__, (self.type, self.to_dict()))
+
+    def __repr__(self):
+        return f"<ResourceTypeMap {self.type} {list(self)}>"
+
+    def to_dict(self):
+        return {name: self[name] for name in self}
+
+
+class ResourceMap(dict):
+    """resource type -> resource name -> attributes"""
+
+    __slots__ = ()
+
+    def __init__(self, resources=None):
+        super().__init__()
+        if resources:
+            self.update(resources)
+
+    @classmethod
+    def from_dict(cls, resources):
+        """wrap a resource dict, other structures are returned as is"""
+        if isinstance(resources, cls):
+            return resources
+        for rmap in resources.values():
+            if not isinstance(rmap, Mapping):
+                return resources
+            if not all(isinstance(attrs, Mapping) for attrs in rmap.values()):
+                return resources
+        return cls(resources)
+
+    def records(self):
+        for rmap in self.values():
+            yield from rmap.records()
+
+    def add_record(self, record):
+        self.setdefault(record.type).add_record(record)
+
+    def setdefault(self, rtype, default=None):
+        if rtype not in self:
+            self[rtype] = default or {}
+        return self[rtype]
+
+    def __setitem__(self, rtype, resources):
+        rmap = ResourceTypeMap(rtype)
+        if isinstance(resources, ResourceTypeMap):
+            for record in resources.records():
+                rmap.add_record(record)
+        else:
+            rmap.update(resources)
+        dict.__setitem__(self, rmap.type, rmap)
+
+    def update(self, *args, **kw):
+        for rtype, resources in dict(*args, **kw).items():
+            self[rtype] = resources
+
+    def copy(self):
+        return self.to_dict()
+
+    def __reduce__(self):
+        return (self.__class__, (self.to_dict(),))
+
+    def __repr__(self):
+        return f"<ResourceMap {list(self)}>"
+
+    def to_dict(self):
+        return {rtype: rmap.to_dict() for rtype, rmap in self.items()}
+
+
+SnapshotMagic = b"PYTFSNAP1\n"
+SnapshotHeader = struct.Struct(">Q")
+
+
+def write_snapshot(path, resources, outputs):
+    """write resources and outputs to a snapshot file.
+
+    the snapshot is a json index of outputs and record offsets followed
+    by the records' attribute blobs as is, such that readers can map
+    it and reference blobs in place. the file is written atomically.
+    """
+    resources = ResourceMap.from_dict(resources)
+    index = {"outputs": outputs, "types": list(resources), "records": []}
+    offset = 0
+    for r in resources.records():
+        index["records"].append((r.type, r.name, offset, len(r.blob)))
+        offset += len(r.blob)
+    header = json.dumps(index).encode("utf8")
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as fh:
+        fh.write(SnapshotMagic)
+        fh.write(SnapshotHeader.pack(len(header)))
+        fh.write(header)
+        for r in resources.records():
+            fh.write(r.blob)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path):
+    """map a snapshot file read only, returns (ResourceMap, outputs)"""
+    with open(path, "rb") as fh:
+        data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(data)
+    pos = len(SnapshotMagic)
+    if view[:pos] != SnapshotMagic:
+        raise ValueError(f"not a state snapshot {path}")
+    (header_size,) = SnapshotHeader.unpack_from(view, pos)
+    pos += SnapshotHeader.size
+    index = json.loads(bytes(view[pos : pos + header_size]))
+    pos += header_size
+
+    resources = ResourceMap()
+    for rtype in index["types"]:
+        resources.setdefault(rtype)
+    for rtype, rname, offset, size in index["records"]:
+        start = pos + offset
+        resources.add_record(ResourceRecord(rtype, rname, view[start : start + size]))
+    return resources, index["outputs"]
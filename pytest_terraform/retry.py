@@ -0,0 +1,87 @@
+# Copyright 2020 Kapil Thangavelu
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Retry of terraform commands failing with transient errors.
+
+A failed command's output is matched against transient error patterns,
+ie. api throttling or network errors, on a match the command is retried
+after an exponential backoff with jitter. Any other failure is raised
+as is.
+"""
+
+import random
+import re
+import subprocess
+import time
+
+from .report import report
+
+DefaultTransientPatterns = (
+    r"(?i)throttl",
+    r"RequestLimitExceeded",
+    r"TooManyRequests",
+    r"Rate exceeded",
+    r"ServiceUnavailable",
+    r"connection reset by peer",
+    r"TLS handshake timeout",
+    r"i/o timeout",
+    r"context deadline exceeded",
+)
+
+
+class RetryPolicy:
+    """retry transient command failures with exponential backoff and jitter
+
+    attempts is the number of retries after the initial failure, delays
+    double from base_delay up to max_delay seconds, each with a random
+    jitter of up to half the delay.
+    """
+
+    def __init__(
+        self,
+        patterns=DefaultTransientPatterns,
+        attempts=2,
+        base_delay=5,
+        max_delay=60,
+        sleep=time.sleep,
+    ):
+        self.patterns = [re.compile(p) for p in patterns]
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+
+    def is_transient(self, error):
+        if getattr(error, "timeout", None) or not error.output:
+            return False
+        output = error.output.decode("utf8", "replace")
+        return any(p.search(output) for p in self.patterns)
+
+    def delay(self, attempt):
+        delay = min(self.max_delay, self.base_delay * 2**attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def call(self, command, func, *args):
+        """call func, retrying transient failures of the named command"""
+        attempt = 0
+        while True:
+            try:
+                return func(*args)
+            except subprocess.CalledProcessError as e:
+                if attempt >= self.attempts or not self.is_transient(e):
+                    raise
+                delay = self.delay(attempt)
+                report.add("retries", command)
+                report.add("retry wait seconds", command, delay)
+                attempt += 1
+                self.sleep(delay)
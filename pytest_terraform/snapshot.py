@@ -0,0 +1,116 @@
+# Copyright 2020 Kapil Thangavelu
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Snapshot runner backend.
+
+The first run of a module applies as usual and captures the resulting
+state and work dir into a tarball, later runs restore the tarball
+instead of running init and apply. Snapshots are keyed by the module
+name and a hash of its configuration files, so changing a module
+captures a new snapshot.
+
+Infrastructure provisioned by this backend outlives the session, it is
+what later sessions restore, destroy is a no-op. Removing a snapshot and
+its infrastructure is left to the user, ie. `terraform destroy -state`.
+"""
+
+import hashlib
+import os
+import tarfile
+
+from pytest_terraform import tf
+from pytest_terraform.backends import DefaultSnapshotDir, register_backend
+from pytest_terraform.report import report
+
+ModuleFileSuffixes = (".tf", ".tf.json", ".tfvars", ".hcl")
+# extraction filters are available on python >= 3.12 and security backports
+ExtractOptions = hasattr(tarfile, "data_filter") and {"filter": "data"} or {}
+
+
+def module_digest(module_dir):
+    """hash of a module directory's configuration files"""
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(module_dir)):
+        if not name.endswith(ModuleFileSuffixes):
+            continue
+        digest.update(name.encode("utf8"))
+        with open(os.path.join(module_dir, name), "rb") as fh:
+            digest.update(fh.read())
+    return digest.hexdigest()[:16]
+
+
+@register_backend("snapshot")
+class SnapshotRunner(tf.TerraformRunner):
+    def __init__(self, work_dir, *args, **kw):
+        super().__init__(work_dir, *args, **kw)
+        self.restored = False
+
+    @property
+    def snapshot_path(self):
+        snapshot_dir = os.path.abspath(tf.LazySnapshotDir.resolve(DefaultSnapshotDir))
+        module_dir = str(self.module_dir or self.work_dir)
+        return os.path.join(
+            snapshot_dir,
+            f"{os.path.basename(module_dir.rstrip(os.sep))}-{module_digest(module_dir)}.tar.gz",
+        )
+
+    def init(self):
+        if os.path.exists(self.snapshot_path):
+            self.restore()
+            return
+        super().init()
+
+    def apply(self, plan=True):
+        if self.restored:
+            return tf.TerraformState.from_file(self.state_path, self, self.projection)
+        state = super().apply(plan)
+        self.capture()
+        return state
+
+    def destroy(self):
+        tf.write_log(f"snapshot backend skipping destroy {self.work_dir}")
+
+    def capture(self):
+        path = self.snapshot_path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with tarfile.open(tmp_path, "w:gz") as tar:
+            tar.add(os.path.normpath(self.state_path), arcname="terraform.tfstate")
+            if os.path.isdir(self.work_dir):
+                tar.add(self.work_dir, arcname="work", filter=_exclude_providers)
+        os.replace(tmp_path, path)
+        report.add("snapshot backend", "captured")
+
+    def restore(self):
+        parent = os.path.dirname(os.path.abspath(self.work_dir))
+        os.makedirs(parent, exist_ok=True)
+        with tarfile.open(self.snapshot_path) as tar:
+            tar.extractall(parent, **ExtractOptions)
+        os.replace(
+            os.path.join(parent, "terraform.tfstate"), os.path.normpath(self.state_path)
+        )
+        if os.path.isdir(os.path.join(parent, "work")) and not os.path.exists(
+            self.work_dir
+        ):
+            os.replace(os.path.join(parent, "work"), self.work_dir)
+        self.restored = True
+        report.add("snapshot backend", "restored")
+
+
+def _exclude_providers(info):
+    # provider binaries are large and only needed to run terraform,
+    # which a restored snapshot doesn't do.
+    parts = info.name.split("/")
+    if len(parts) > 1 and parts[1] in ("providers", "tfplan"):
+        return None
+    return info
@@ -12,36 +12,110 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import contextlib
+import fnmatch
+import inspect
 import json
 import os
+import re
+import shutil
+import signal
 import subprocess
 import sys
-from collections import UserString, defaultdict
+import tempfile
+import threading
+from collections import UserString, defaultdict, deque
 from typing import Any, Dict, Optional, Tuple, Union
 
-import jmespath
 import pytest
 from py.path import local
 
-from .exceptions import InvalidState, ModuleNotFound, TerraformCommandFailed
+from . import jsonstream
+from .backends import get_backend, register_backend
+from .cache import PluginCache
+from .disk import usage
+from .exceptions import (
+    InvalidOption,
+    InvalidState,
+    ModuleNotFound,
+    TerraformCommandFailed,
+)
 from .options import teardown as td
+from .projection import Projection
+from .report import report
+from .resources import ResourceMap, read_snapshot, to_dict, write_snapshot
+
+# upstream fixture outputs, written next to a dependent fixture's state
+UpstreamVarFile = "upstream.tfvars.json"
+# opts in to linking cached providers missing from a module's lock file
+BreakLockFileEnv = "TF_PLUGIN_CACHE_MAY_BREAK_DEPENDENCY_LOCK_FILE"
+
+
+class CommandTimeout(subprocess.CalledProcessError):
+    """a terraform command killed after exceeding its timeout"""
+
+    def __init__(self, returncode, cmd, timeout, output=None):
+        super().__init__(returncode, cmd, output=output)
+        self.timeout = timeout
+
+
+class OutputTail:
+    """Bounded ring buffer of command output.
+
+    only the last `size` bytes written are retained, which is what we
+    attach to failure reports, regardless of how chatty the command is.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.chunks = deque()
+        self.length = 0
+
+    def write(self, data):
+        self.chunks.append(data)
+        self.length += len(data)
+        while self.length - len(self.chunks[0]) >= self.size:
+            self.length -= len(self.chunks.popleft())
+
+    def getvalue(self):
+        return b"".join(self.chunks)[-self.size :]
 
 
 class TerraformRunner(object):
     command_templates = {
         "init": "init {input} {color} {plugin_dir}",
-        "apply": "apply {input} {color} {state} {approve} {plan}",
-        "plan": "plan {input} {color} {state} {output}",
-        "destroy": "destroy {input} {color} {state} {approve}",
+        "apply": (
+            "apply {input} {color} {state} {approve} {parallelism} {var_file} {plan}"
+        ),
+        "plan": "plan {input} {color} {state} {parallelism} {var_file} {output}",
+        "destroy": (
+            "destroy {input} {color} {state} {approve} {refresh} {parallelism} {var_file}"
+        ),
         "show": "show {color} -json {state_path}",
+        "mirror": "providers mirror -platform={platform} {target}",
+        "version": "version -json",
     }
 
     template_defaults = {
         "input": "-input=false",
         "color": "-no-color",
         "approve": "-auto-approve",
+        "refresh": "",
+        "parallelism": "",
+        "var_file": "",
     }
 
+    # resource type prefixes of providers whose resources are purely
+    # local, which fast destroy removes without running terraform.
+    local_providers = ("local", "null", "random", "tls")
+    fast_destroy_parallelism = 30
+
+    # bytes of trailing command output retained for failure reports
+    output_tail_size = 64 * 1024
+    # seconds a timed out command has to exit after an interrupt, before
+    # its process group is killed.
+    kill_grace = 10
+
     def __init__(
         self,
         work_dir,
@@ -50,66 +124,209 @@ class TerraformRunner(object):
         plugin_cache=None,
         stream_output=None,
         tf_bin=None,
+        projection=None,
+        provider_mirror=None,
+        fast_destroy=False,
+        parallelism=None,
+        timeouts=None,
+        retry_policy=None,
+        prune=False,
+        break_lock_file=False,
     ):
         self.work_dir = work_dir
         self.module_dir = module_dir
         # use parent dir of work/data dir to avoid
         # https://github.com/hashicorp/terraform/issues/22999
-        self.state_path = state_path or os.path.join(
-            work_dir, "..", "terraform.tfstate"
-        )
-        self.stream_output = stream_output
+        self.state_path = state_path or os.path.join(work_dir, "..", "terraform.tfstate")
+        # echo command output as its produced, the default matches
+        # terraform writing to our inherited stdout.
+        self.stream_output = True if stream_output is None else stream_output
         self.plugin_cache = plugin_cache or ""
+        # link cached providers even when the lock file lacks their checksums
+        self.break_lock_file = break_lock_file
         self.tf_bin = tf_bin
+        self.projection = projection
+        self.provider_mirror = provider_mirror
+        self.fast_destroy = fast_destroy
+        self.parallelism = parallelism
+        # terraform command name (or default) -> seconds
+        self.timeouts = timeouts or {}
+        self.retry_policy = retry_policy
+        # remove the work dir and state once destroyed
+        self.prune = prune
 
     def apply(self, plan=True):
         """run terraform apply"""
-        if plan:
-            plan_path = os.path.join(self.work_dir, "tfplan")
-            self.plan(plan_path)
-            apply_args = self._get_cmd_args("apply", plan=plan_path)
-        else:
-            apply_args = self._get_cmd_args("apply", plan="")
         try:
-            self._run_cmd(apply_args)
-            return TerraformState.from_file(self.state_path, self)
+            self._retry("apply", self._apply, plan)
+            usage.add(os.path.dirname(self.work_dir))
+            return TerraformState.from_file(self.state_path, self, self.projection)
+        except CommandTimeout:
+            # a hung provider is likely to hang destroy as well, leave
+            # partial state to the fixture's teardown mode.
+            raise
         except subprocess.CalledProcessError as e:
             try:
-                # Try to destroy partially applied resources
-                self.destroy()
+                # Try to destroy partially applied resources, the work
+                # dir is pruned by the fixture's teardown.
+                self._destroy()
             finally:
                 raise e from None
 
+    def _apply(self, plan):
+        # a retried apply plans again from the partially applied state,
+        # keeping resources which were already created.
+        if plan:
+            plan_path = os.path.join(self.work_dir, "tfplan")
+            self.plan(plan_path)
+            # variables are part of the saved plan
+            apply_args = self._get_cmd_args("apply", plan=plan_path, var_file="")
+        else:
+            apply_args = self._get_cmd_args("apply", plan="")
+        self._run_cmd(apply_args)
+
+    def _retry(self, command, func, *args):
+        if not self.retry_policy:
+            return func(*args)
+        return self.retry_policy.call(command, func, *args)
+
     def plan(self, output=""):
         output = output and "-out=%s" % output or ""
         self._run_cmd(self._get_cmd_args("plan", output=output))
 
     def init(self):
-        self._run_cmd(self._get_cmd_args("init", plugin_dir=""))
+        plugin_dir = ""
+        if self.provider_mirror:
+            self.provider_mirror.ensure(self)
+            plugin_dir = f"-plugin-dir={self.provider_mirror.path}"
+        init_args = self._get_cmd_args("init", plugin_dir=plugin_dir)
+        if not self.plugin_cache:
+            return self._run_cmd(init_args)
+        cache = PluginCache(self.plugin_cache)
+        before = cache.providers()
+        if self.module_dir and cache.warm(self.module_dir):
+            self._run_cmd(init_args)
+        else:
+            with cache.lock():
+                before = cache.providers()
+                self._run_cmd(init_args)
+        data_dir = self.module_dir and self.work_dir
+        cache.record_init(before, data_dir or os.path.join(self.work_dir, ".terraform"))
 
     def destroy(self):
-        self._run_cmd(self._get_cmd_args("destroy"))
+        self._destroy()
+        if self.prune:
+            self.prune_work_dir()
+
+    def _destroy(self):
+        if not self.fast_destroy:
+            return self._retry("destroy", self._run_cmd, self._get_cmd_args("destroy"))
+        if self._remove_local_state():
+            return
+        self._retry(
+            "destroy",
+            self._run_cmd,
+            self._get_cmd_args(
+                "destroy",
+                refresh="-refresh=false",
+                parallelism="-parallelism="
+                f"{max(self.fast_destroy_parallelism, self.parallelism or 0)}",
+            ),
+        )
+
+    def _remove_local_state(self):
+        """remove state of purely local resources without running terraform
+
+        returns True if the state was removed.
+        """
+        state_path = os.path.normpath(self.state_path)
+        if not os.path.isfile(state_path):
+            return False
+        with open(state_path, encoding="utf8") as fh:
+            resources = TerraformState.parse_state_resources(fh)
+        for _, rtype, _, _, _ in resources:
+            if rtype.split("_", 1)[0] not in self.local_providers:
+                return False
+        cwd = self.module_dir or self.work_dir
+        for mode, rtype, _, _, attrs in resources:
+            # data sources read files the module doesn't own
+            if mode != "managed" or attrs is None:
+                continue
+            if rtype in ("local_file", "local_sensitive_file"):
+                path = os.path.join(cwd, attrs["filename"])
+                if os.path.exists(path):
+                    os.remove(path)
+        os.remove(state_path)
+        write_log("fast destroy removed local state", self.work_dir)
+        report.add("fast destroy", "terraform skipped")
+        return True
+
+    def prune_work_dir(self):
+        """remove the work dir, state and var files of a destroyed module"""
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        state_path = os.path.normpath(self.state_path)
+        for path in (state_path, state_path + ".backup", self.var_file):
+            if os.path.exists(path):
+                os.remove(path)
+        parent = os.path.dirname(self.work_dir)
+        try:
+            # the numbered temp dir, if there's nothing else in it
+            os.rmdir(parent)
+        except OSError:
+            pass
+        usage.remove(parent)
+        report.add("work dirs", "pruned")
+
+    def mirror_providers(self, target, platform):
+        self._run_cmd(self._get_cmd_args("mirror", target=target, platform=platform))
+
+    def version(self):
+        return self._run_cmd(self._get_cmd_args("version"), output=json.load)
 
     def show(self):
-        return json.loads(
-            self._run_cmd(
-                self._get_cmd_args("show", state_path=self.state_path), output=True
-            ).decode("utf8")
+        return self._run_cmd(
+            self._get_cmd_args("show", state_path=self.state_path), output=json.load
         )
 
+    @property
+    def var_file(self):
+        """path of the upstream fixtures' outputs, see TerraformFixture.depends_on"""
+        return os.path.join(os.path.dirname(self.work_dir), UpstreamVarFile)
+
     def _get_cmd_args(self, cmd_name, tf_bin=None, env=None, **kw):
         tf_bin = tf_bin and tf_bin or self.tf_bin
-        kw.update(self.template_defaults)
+        if "var_file" not in kw and os.path.exists(self.var_file):
+            kw["var_file"] = f"-var-file={self.var_file}"
+        kw = dict(self.template_defaults, **kw)
+        if self.parallelism and not kw["parallelism"]:
+            kw["parallelism"] = f"-parallelism={self.parallelism}"
         kw["state"] = self.state_path and "-state=%s" % self.state_path or ""
         return [tf_bin] + list(
             filter(None, self.command_templates[cmd_name].format(**kw).split(" "))
         )
 
-    def _run_cmd(self, args, output=False):
+    def _run_cmd(self, args, output=None):
+        """run a terraform command
+
+        output is an optional callable which is passed the command's stdout
+        as a binary stream, its return value is returned. stdout is spooled
+        to a temporary file, and only passed on once the command succeeded.
+        all other output is pumped through a bounded tail buffer, which is
+        attached to the CalledProcessError raised on failure.
+
+        terraform runs in its own process group, on exceeding the command's
+        timeout the group is interrupted, and killed after a grace period,
+        raising CommandTimeout. a KeyboardInterrupt is passed on to the group
+        the same way.
+        """
+        timeout = self.timeouts.get(args[1], self.timeouts.get("default"))
         env = dict(os.environ)
         tf_env = {}
-        if LazyPluginCacheDir.resolve(False):
-            tf_env["TF_PLUGIN_CACHE_DIR"] = LazyPluginCacheDir.resolve()
+        if self.plugin_cache:
+            tf_env["TF_PLUGIN_CACHE_DIR"] = self.plugin_cache
+            # a value set in the environment is left as is
+            if self.break_lock_file and BreakLockFileEnv not in os.environ:
+                tf_env[BreakLockFileEnv] = "true"
         tf_env["TF_IN_AUTOMATION"] = "yes"
         if self.module_dir:
             tf_env["TF_DATA_DIR"] = self.work_dir
@@ -117,10 +334,93 @@ class TerraformRunner(object):
         env.update(tf_env)
 
         write_log("run cmd", args, tf_env, cwd)
-        run_cmd = subprocess.check_call
-        if output:
-            run_cmd = subprocess.check_output
-        return run_cmd(args, cwd=cwd, stderr=subprocess.STDOUT, env=env)
+        tail = OutputTail(self.output_tail_size)
+        proc = subprocess.Popen(
+            args,
+            cwd=cwd,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=output and subprocess.PIPE or subprocess.STDOUT,
+            start_new_session=True,
+        )
+        timed_out = threading.Event()
+        timer = None
+        if timeout:
+            timer = threading.Timer(timeout, self._interrupt, (proc, timed_out))
+            timer.daemon = True
+            timer.start()
+        with contextlib.ExitStack() as stack:
+            spool = output and stack.enter_context(tempfile.TemporaryFile())
+            try:
+                if output:
+                    pump = threading.Thread(
+                        target=self._pump_output,
+                        args=(proc.stderr, tail),
+                        daemon=True,
+                    )
+                    pump.start()
+                    shutil.copyfileobj(proc.stdout, spool)
+                    pump.join()
+                else:
+                    self._pump_output(proc.stdout, tail)
+            except KeyboardInterrupt:
+                # terraform's session doesn't get the terminal's interrupt,
+                # pass it on to let an apply or destroy stop cleanly.
+                self._stop(proc)
+                raise
+            except BaseException:
+                _signal_group(proc, getattr(signal, "SIGKILL", None))
+                proc.wait()
+                raise
+            finally:
+                proc.stdout.close()
+            returncode = proc.wait()
+            if timer:
+                timer.cancel()
+            if timed_out.is_set():
+                report.add("timeouts", args[1])
+                raise CommandTimeout(returncode, args, timeout, output=tail.getvalue())
+            if returncode:
+                raise subprocess.CalledProcessError(
+                    returncode, args, output=tail.getvalue()
+                )
+            if output:
+                spool.seek(0)
+                return output(spool)
+
+    def _interrupt(self, proc, timed_out):
+        timed_out.set()
+        write_log("terraform command timed out, interrupting", proc.args)
+        self._stop(proc)
+
+    def _stop(self, proc):
+        """interrupt terraform's process group, killing it after a grace period"""
+        _signal_group(proc, signal.SIGINT)
+        try:
+            proc.wait(self.kill_grace)
+        except subprocess.TimeoutExpired:
+            _signal_group(proc, getattr(signal, "SIGKILL", None))
+
+    def _pump_output(self, stream, tail):
+        for line in iter(stream.readline, b""):
+            tail.write(line)
+            if self.stream_output:
+                sys.stdout.write(line.decode("utf8", "replace"))
+        stream.close()
+
+
+register_backend("subprocess", TerraformRunner)
+
+
+def _signal_group(proc, sig):
+    """signal a process's group, falling back to the process on windows"""
+    if sig is None or not hasattr(os, "killpg"):
+        proc.kill()
+        return
+    try:
+        os.killpg(proc.pid, sig)
+    except ProcessLookupError:
+        pass
 
 
 class TerraformStateJson(UserString):
@@ -168,6 +468,9 @@ class TerraformState(object):
 
     by default all resources will have an 'id' attribute, additional
     attributes which contain the key 'name' will also be present.
+
+    resources are stored compactly in a ResourceMap, which decodes
+    attributes on first access.
     """
 
     def __init__(self, resources, outputs, runner=None):
@@ -175,6 +478,14 @@ class TerraformState(object):
         self.outputs = outputs
         self.resources = resources
 
+    @property
+    def resources(self):
+        return self._resources
+
+    @resources.setter
+    def resources(self, resources):
+        self._resources = ResourceMap.from_dict(resources)
+
     @property
     def work_dir(self):
         if self._runner:
@@ -204,13 +515,20 @@ class TerraformState(object):
         the string value of 'id' is returned.
         """
         if "." in k:
-            return jmespath.search(k, self.resources)
+            import jmespath
+            from jmespath.exceptions import JMESPathTypeError
+
+            try:
+                # only the resources the expression visits are decoded
+                return jmespath.search(k, self.resources)
+            except JMESPathTypeError:
+                # jmespath functions check for exact dict types
+                return jmespath.search(k, to_dict(self.resources))
         found = False
-        for rtype in self.resources:
-            for rname in self.resources[rtype]:
-                if rname == k:
-                    assert found is False, "Ambigious resource name %s" % k
-                    found = self.resources[rtype][rname]
+        for rmap in self.resources.values():
+            if k in rmap:
+                assert found is False, "Ambigious resource name %s" % k
+                found = rmap[k]
         if found:
             if len(found) == 1:
                 return found["id"]
@@ -218,28 +536,48 @@ class TerraformState(object):
         return default
 
     @classmethod
-    def from_file(cls, path: str, runner=None):
+    def from_file(cls, path: str, runner=None, projection=None, module=None):
         """create TerraformState from a file
 
         File can either be a Terraform Plan state, or a recorded
-        pytest-terraform state
+        pytest-terraform state. An optional Projection selects
+        which resource attributes are kept, and module selects only
+        resources of the given child module address.
         """
         if not os.path.isfile(path):
             raise InvalidState("{} could not be located".format(path))
 
-        with open(path) as fh:
-            state = fh.read()
+        with open(path, encoding="utf8") as fh:
+            try:
+                resources, outputs = cls.parse_state_stream(fh, projection, module)
+            except ValueError as e:
+                raise InvalidState(f"{path} could not be parsed: {e}")
 
-        return cls.from_string(state, runner)
+        return cls(resources, outputs, runner)
 
     @classmethod
-    def from_string(cls, state: Union[TerraformStateJson, str], runner=None):
+    def from_snapshot(cls, path: str, runner=None):
+        """create TerraformState from a mapped state snapshot"""
+        try:
+            resources, outputs = read_snapshot(str(path))
+        except (OSError, ValueError) as e:
+            raise InvalidState(f"{path} could not be loaded: {e}")
+        return cls(resources, outputs, runner)
+
+    def snapshot(self, path: str):
+        """write a snapshot of state for mapping by other processes"""
+        write_snapshot(str(path), self.resources, self.outputs)
+
+    @classmethod
+    def from_string(
+        cls, state: Union[TerraformStateJson, str], runner=None, projection=None
+    ):
         """create TerraformState from string
 
         State string can be a bytestring or a TerraformStateJson
         string object
         """
-        resources, outputs = cls.parse_state(state)
+        resources, outputs = cls.parse_state(state, projection)
         return cls(resources, outputs, runner)
 
     def update(self, state: Union[TerraformStateJson, str]):
@@ -251,6 +589,7 @@ class TerraformState(object):
     @staticmethod
     def parse_state(
         state: Union[TerraformStateJson, str],
+        projection=None,
     ) -> Tuple[Dict[str, any], Dict[str, Any]]:
         """extract resources and outputs from state
 
@@ -264,19 +603,113 @@ class TerraformState(object):
         else:
             data = json.loads(state)
 
+        projection = projection or Projection()
         if "pytest-terraform" in data:
-            return (data["resources"], data["outputs"])
+            return (
+                ResourceMap.from_dict(projection.apply_resources(data["resources"])),
+                data["outputs"],
+            )
 
-        resources = {}
+        resources = ResourceMap()
         outputs = {}
 
         for r in data.get("resources", ()):
             rmap = resources.setdefault(r["type"], {})
             if len(r["instances"]) > 0:
-                rmap[r["name"]] = dict(r["instances"][0]["attributes"])
+                rmap[r["name"]] = projection.apply(
+                    r["type"], r["name"], dict(r["instances"][0]["attributes"])
+                )
 
         outputs = data.get("outputs", {})
-        for m in data.get("modules", ()):
+        TerraformState._parse_legacy_modules(
+            data.get("modules", ()), resources, projection
+        )
+        return (resources, outputs)
+
+    @staticmethod
+    def parse_state_stream(fh, projection=None, module=None):
+        """extract resources and outputs from a state file handle
+
+        the state is walked incrementally, only the resource map
+        and outputs are materialized, not the full document. returns
+        the resource map and the outputs dict, as parse_state does.
+        """
+        cursor = jsonstream.JsonCursor(fh)
+        projection = projection or Projection()
+        resources = ResourceMap()
+        outputs = {}
+
+        for key in cursor.iter_map():
+            if key == "outputs":
+                outputs = cursor.read_value()
+            elif key == "resources" and cursor.peek() == "{":
+                # recorded pytest-terraform state
+                for rtype in cursor.iter_map():
+                    rmap = resources.setdefault(rtype)
+                    for rname in cursor.iter_map():
+                        rmap[rname] = projection.apply(rtype, rname, cursor.read_value())
+            elif key == "resources":
+                for _ in cursor.iter_array():
+                    _, rtype, rname, rmodule, attrs = TerraformState._parse_resource(
+                        cursor
+                    )
+                    if module is not None and rmodule != module:
+                        continue
+                    rmap = resources.setdefault(rtype, {})
+                    if attrs is not None:
+                        rmap[rname] = projection.apply(rtype, rname, dict(attrs))
+            elif key == "modules":
+                TerraformState._parse_legacy_modules(
+                    cursor.read_value(), resources, projection
+                )
+            else:
+                cursor.skip()
+
+        return (resources, outputs)
+
+    @staticmethod
+    def _parse_resource(cursor):
+        """returns a resource's mode, type, name, module and attributes"""
+        mode = rtype = rname = rmodule = attrs = None
+        for key in cursor.iter_map():
+            if key == "mode":
+                mode = cursor.read_value()
+            elif key == "type":
+                rtype = cursor.read_value()
+            elif key == "name":
+                rname = cursor.read_value()
+            elif key == "module":
+                rmodule = cursor.read_value()
+            elif key == "instances":
+                for idx in cursor.iter_array():
+                    if idx == 0:
+                        attrs = cursor.read_value()["attributes"]
+                    else:
+                        cursor.skip()
+            else:
+                cursor.skip()
+        return mode, rtype, rname, rmodule, attrs
+
+    @staticmethod
+    def parse_state_resources(fh):
+        """return the resources of a terraform state file handle, as tuples
+
+        see _parse_resource, unlike parse_state data sources are told
+        apart from managed resources.
+        """
+        cursor = jsonstream.JsonCursor(fh)
+        resources = []
+        for key in cursor.iter_map():
+            if key == "resources" and cursor.peek() == "[":
+                for _ in cursor.iter_array():
+                    resources.append(TerraformState._parse_resource(cursor))
+            else:
+                cursor.skip()
+        return resources
+
+    @staticmethod
+    def _parse_legacy_modules(modules, resources, projection):
+        for m in modules:
             for k, r in m.get("resources", {}).items():
                 if k.startswith("data"):
                     continue
@@ -286,30 +719,99 @@ class TerraformState(object):
                 for kattr, vattr in r["primary"]["attributes"].items():
                     if "name" in kattr and vattr != rattrs["id"]:
                         rattrs[kattr] = vattr
-                rmap[rname] = rattrs
-
-        return (resources, outputs)
-
-    def export(self):
-        """export state as a TerraformStateJson UserString"""
+                rmap[rname] = projection.apply(module, rname, rattrs)
 
+    def as_dict(self, redactor=None):
+        """return the recording of the state as a dict"""
         state = {
             "pytest-terraform": 1,
             "outputs": self.outputs,
-            "resources": self.resources,
+            "resources": to_dict(self.resources),
         }
+        if redactor:
+            state = redactor.redact(state)
+        return state
 
-        return TerraformStateJson.from_dict(state)
+    def export(self, redactor=None):
+        """export state as a TerraformStateJson UserString"""
+        return TerraformStateJson.from_dict(self.as_dict(redactor))
 
-    def save(self, state_path: Optional[str] = None) -> Optional[TerraformStateJson]:
-        """export state to a file"""
+    def save(
+        self, state_path: Optional[str] = None, volatile=None
+    ) -> Optional[TerraformStateJson]:
+        """export state to a file, see write_recording"""
 
-        output = self.export()
         if not state_path:
-            return output
+            return self.export()
+
+        write_recording(state_path, self.as_dict(), volatile)
+
+
+DefaultVolatileKeys = (
+    "creat*_date",
+    "creat*_time",
+    "created_at",
+    "last_modified*",
+    "last_updated*",
+    "updated_at",
+    "*timestamp",
+)
+
+
+def key_matcher(patterns):
+    """compile key globs into a single match function, None without patterns"""
+    patterns = [fnmatch.translate(p.strip()) for p in patterns if p.strip()]
+    return patterns and re.compile("|".join(patterns)).match or None
 
-        with open(state_path, "w") as fh:
-            fh.write(str(output))
+
+def write_recording(path, state, volatile=None):
+    """write a recording atomically, only if its content changed.
+
+    keys are sorted for a stable serialization, and values of keys
+    matching volatile are carried over from the existing recording, such
+    that re-recording an unchanged module leaves the file untouched.
+    returns whether the file was written, nothing is written when the
+    recording's directory doesn't exist.
+    """
+    path = os.fspath(path)
+    if not os.path.isdir(os.path.dirname(path) or os.curdir):
+        write_log("recording dir missing", path)
+        return False
+    data = json.dumps(state, indent=4, sort_keys=True)
+    try:
+        with open(path) as fh:
+            previous = fh.read()
+    except FileNotFoundError:
+        previous = None
+    if volatile and previous is not None and previous != data:
+        try:
+            state = _carry_volatile(state, json.loads(previous), volatile)
+        except ValueError:
+            pass
+        else:
+            data = json.dumps(state, indent=4, sort_keys=True)
+    if data == previous:
+        report.add("recordings", "unchanged")
+        return False
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as fh:
+        fh.write(data)
+    os.replace(tmp_path, path)
+    report.add("recordings", "written")
+    return True
+
+
+def _carry_volatile(new, old, volatile):
+    if isinstance(new, dict) and isinstance(old, dict):
+        return {
+            k: old[k]
+            if k in old and volatile(k)
+            else _carry_volatile(v, old.get(k), volatile)
+            for k, v in new.items()
+        }
+    if isinstance(new, list) and isinstance(old, list) and len(new) == len(old):
+        return [_carry_volatile(n, o, volatile) for n, o in zip(new, old)]
+    return new
 
 
 class TerraformTestApi(TerraformState):
@@ -341,6 +843,42 @@ LazyPluginCacheDir = PlaceHolderValue("plugin_cache")
 LazyTfBin = PlaceHolderValue("tf_bin_path")
 PytestConfig = PlaceHolderValue("pytestconfig")
 LazyTFDebug = PlaceHolderValue("tf_debug")
+LazyProjection = PlaceHolderValue("projection")
+LazyProviderMirror = PlaceHolderValue("provider_mirror")
+LazyComposite = PlaceHolderValue("composite")
+LazyBackend = PlaceHolderValue("backend")
+LazySnapshotDir = PlaceHolderValue("snapshot_dir")
+LazyFastDestroy = PlaceHolderValue("fast_destroy")
+LazyParallelism = PlaceHolderValue("parallelism")
+LazyTimeouts = PlaceHolderValue("timeouts")
+LazyRetryPolicy = PlaceHolderValue("retry_policy")
+LazyManifest = PlaceHolderValue("manifest")
+LazyRedactor = PlaceHolderValue("redactor")
+LazyVolatileKeys = PlaceHolderValue("volatile_keys")
+LazyKeepWorkDirs = PlaceHolderValue("keep_work_dirs")
+LazyBreakLockFile = PlaceHolderValue("break_lock_file")
+LazyJournal = PlaceHolderValue("journal")
+
+# terraform's own default parallelism
+DefaultParallelism = 10
+# concurrent resource operations allowed across all xdist workers in
+# auto mode, keeping the machine as a whole within api rate limits.
+AutoParallelismBudget = 64
+
+
+def auto_parallelism(resource_count, workers=1):
+    """pick a parallelism from a module's resource count and worker count"""
+    per_worker = max(1, AutoParallelismBudget // max(workers, 1))
+    if not resource_count:
+        return min(DefaultParallelism, per_worker)
+    return min(resource_count, per_worker)
+
+
+def discover_tf_bin():
+    """the terraform binary, looked up on path on first use"""
+    if LazyTfBin.value is None:
+        LazyTfBin.value = shutil.which("tofu") or shutil.which("terraform")
+    return LazyTfBin.value
 
 
 def write_log(msg, *parts):
@@ -361,6 +899,10 @@ class TerraformFixture(object):
         replay,
         teardown,
         pytest_config,
+        projection=None,
+        backend=None,
+        parallelism=None,
+        depends_on=(),
     ):
         self.tf_bin = tf_bin
         self.tf_root_module = tf_root_module
@@ -370,6 +912,15 @@ class TerraformFixture(object):
         self.runner = None
         self.teardown_config = td.resolve(teardown)
         self.config = pytest_config
+        self.projection = projection
+        self._projection = None
+        self.backend = backend
+        self.parallelism = parallelism
+        # names of upstream fixtures, and their values once provisioned
+        self.depends_on = tuple(depends_on or ())
+        self.upstream = {}
+        # name of the pytest fixture, set on registration
+        self.fixture_name = self.name
 
     @property
     def name(self):
@@ -377,82 +928,224 @@ class TerraformFixture(object):
 
     __name__ = name
 
-    def resolve_module_dir(self):
-        candidates = [
-            self.test_dir.join(self.tf_root_module),
-            self.test_dir.join("terraform", self.tf_root_module),
-            self.test_dir.dirpath().join(self.tf_root_module),
-            self.test_dir.dirpath().join("terraform", self.tf_root_module),
+    def module_roots(self):
+        """directories searched for the fixture's module, in order"""
+        roots = [
+            self.test_dir,
+            self.test_dir.join("terraform"),
+            self.test_dir.dirpath(),
+            self.test_dir.dirpath().join("terraform"),
         ]
         if LazyModuleDir.resolve():
-            candidates.insert(
-                0, local(LazyModuleDir.resolve()).join(self.tf_root_module)
-            )
-        for candidate in candidates:
-            if not candidate.check(exists=1, dir=1):
-                continue
-            return candidate
+            roots.insert(0, local(LazyModuleDir.resolve()))
+        return roots
+
+    def resolve_module_dir(self):
+        manifest = LazyManifest.resolve(False)
+        if manifest:
+            entry = manifest.lookup(self.module_roots(), self.tf_root_module)
+            if entry is None:
+                raise ModuleNotFound(self.tf_root_module)
+            return local(entry.module_dir)
+        for root in self.module_roots():
+            candidate = root.join(self.tf_root_module)
+            if candidate.check(exists=1, dir=1):
+                return candidate
         raise ModuleNotFound(self.tf_root_module)
 
-    def get_runner(self, module_dir, work_dir):
-        return TerraformRunner(
+    def resolve_recording(self):
+        """path of the module's recording, None if it hasn't been recorded"""
+        manifest = LazyManifest.resolve(False)
+        if manifest:
+            entry = manifest.lookup(self.module_roots(), self.tf_root_module)
+            if entry is None:
+                raise ModuleNotFound(self.tf_root_module)
+            return entry.recording
+        recording = os.path.join(self.resolve_module_dir(), "tf_resources.json")
+        return os.path.exists(recording) and recording or None
+
+    def get_projection(self):
+        if self.projection is not None:
+            return Projection(self.projection)
+        return Projection(LazyProjection.resolve(()))
+
+    def get_parallelism(self, module_dir):
+        """resolve the fixture's parallelism, None for terraform's default"""
+        value = self.parallelism
+        if value is None:
+            value = LazyParallelism.resolve("")
+        if value == "":
+            return None
+        if value == "auto":
+            recording = os.path.join(str(module_dir), "tf_resources.json")
+            count = 0
+            if os.path.exists(recording):
+                resources = TerraformState.from_file(recording).resources
+                count = sum(len(rmap) for rmap in resources.values())
+            workers = int(os.environ.get("PYTEST_XDIST_WORKER_COUNT", "1"))
+            return auto_parallelism(count, workers)
+        try:
+            parallelism = int(value)
+        except (TypeError, ValueError):
+            parallelism = 0
+        if parallelism < 1:
+            raise InvalidOption(
+                f"parallelism must be a positive integer or auto: {value}"
+            )
+        return parallelism
+
+    def get_runner(self, module_dir, work_dir, stream_output=None):
+        runner_class = get_backend(self.backend or LazyBackend.resolve(False))
+        return runner_class(
             str(work_dir),
             module_dir=module_dir,
             plugin_cache=LazyPluginCacheDir.resolve(False),
-            tf_bin=LazyTfBin.resolve(),
+            stream_output=stream_output,
+            tf_bin=discover_tf_bin(),
+            projection=self._projection,
+            provider_mirror=LazyProviderMirror.resolve(False),
+            fast_destroy=LazyFastDestroy.resolve(False),
+            parallelism=self.get_parallelism(module_dir),
+            timeouts=LazyTimeouts.resolve({}),
+            retry_policy=LazyRetryPolicy.resolve(False),
+            prune=not LazyKeepWorkDirs.resolve(False),
+            break_lock_file=LazyBreakLockFile.resolve(False),
         )
 
+    def report_projection(self, projection):
+        if projection.saved:
+            report.add("projection bytes saved", self.name, projection.saved)
+
     def __call__(self, request, tmpdir_factory, worker_id):
-        module_dir = self.resolve_module_dir()
         if self.replay:
-            replay_resources = os.path.join(module_dir, "tf_resources.json")
-            if not os.path.exists(replay_resources):
+            replay_resources = self.resolve_recording()
+            if replay_resources is None:
                 raise ValueError(
                     "Replay resources don't exist for %s" % self.tf_root_module
                 )
-            return TerraformTestApi.from_file(
-                os.path.join(module_dir, "tf_resources.json")
-            )
-        work_dir = tmpdir_factory.mktemp(self.tf_root_module, numbered=True).join(
-            "work"
-        )
+            projection = self.get_projection()
+            test_api = TerraformTestApi.from_file(replay_resources, projection=projection)
+            self.report_projection(projection)
+            return test_api
+        module_dir = self.resolve_module_dir()
+        self._projection = self.get_projection()
+        work_dir = self.make_work_dir(tmpdir_factory)
+        self.write_upstream(work_dir)
         self.runner = self.get_runner(module_dir, work_dir)
         return self.create(request, module_dir)
 
+    def write_upstream(self, work_dir):
+        """write upstream fixtures' outputs as a var file for the module
+
+        each upstream is an object variable named after the fixture,
+        with its outputs as attributes.
+        """
+        if not self.upstream:
+            return
+        values = {
+            name: {k: o["value"] for k, o in api.outputs.items()}
+            for name, api in self.upstream.items()
+        }
+        var_file = os.path.join(os.path.dirname(str(work_dir)), UpstreamVarFile)
+        os.makedirs(os.path.dirname(var_file), exist_ok=True)
+        with open(var_file, "w") as fh:
+            json.dump(values, fh)
+
+    def make_work_dir(self, tmpdir_factory):
+        journal = self.get_journal()
+        if journal:
+            return journal.work_dir(self.tf_root_module)
+        return tmpdir_factory.mktemp(self.tf_root_module, numbered=True).join("work")
+
+    def get_journal(self):
+        """the journal, if enabled, fixtures without teardown aren't journaled"""
+        if self.teardown_config == td.OFF:
+            return None
+        return LazyJournal.resolve(False)
+
     def create(self, request, module_dir):
         write_log("tf create %s" % self.tf_root_module)
-        self.runner.init()
+        state = self.provision(request, module_dir)
+        if self._projection is not None:
+            self.report_projection(self._projection)
+        return self.record(state, module_dir)
+
+    def provision(self, request, module_dir):
+        """init and apply the runner's module, returns the applied state
+
+        the apply is journaled, and an intact leftover apply of the
+        module is adopted in its place.
+        """
+        journal = self.get_journal()
+        state = journal and self.adopt(journal, module_dir)
+        if not state:
+            if journal:
+                journal.write(self.runner, self.tf_root_module, "applying")
+            self.runner.init()
         if self.teardown_config != td.OFF:
             request.addfinalizer(self.tear_down)
-        try:
-            state = self.runner.apply()
-            state_json = state.export()
-            test_api = TerraformTestApi.from_string(state_json, self.runner)
+        if not state:
+            try:
+                state = self.runner.apply()
+            except subprocess.CalledProcessError as e:
+                raise TerraformCommandFailed.from_process_error(e) from e
+            if journal:
+                journal.write(self.runner, self.tf_root_module, "applied")
+        return state
+
+    def adopt(self, journal, module_dir):
+        """use the intact state of a crashed run's apply, in place of applying"""
+        entry = journal.adopt(self.tf_root_module, module_dir)
+        if entry is None:
+            return None
+        write_log(f"tf adopt {self.tf_root_module}", entry["work_dir"])
+        shutil.rmtree(os.path.dirname(self.runner.work_dir), ignore_errors=True)
+        self.runner = self.get_runner(module_dir, entry["work_dir"])
+        return TerraformState.from_file(
+            self.runner.state_path, self.runner, self.runner.projection
+        )
 
-            self.config.hook.pytest_terraform_modify_state(tfstate=state_json)
+    def record(self, state, module_dir):
+        """save the recording of an applied state, returns the test api"""
+        # the test api shares the parsed state, the hook only sees an
+        # exported copy and update rebinds rather than mutates.
+        runner = state.terraform or self.runner
+        test_api = TerraformTestApi(state.resources, state.outputs, runner)
+        state_json = state.export(LazyRedactor.resolve(False))
 
-            state.update(state_json)
-            state.save(module_dir.join("tf_resources.json"))
+        self.config.hook.pytest_terraform_modify_state(tfstate=state_json)
 
-            return test_api
-        except Exception:
-            raise
+        state.update(state_json)
+        state.save(module_dir.join("tf_resources.json"), LazyVolatileKeys.resolve(False))
+
+        return test_api
 
     def tear_down(self):
         # config behavor on runner
         write_log("tf teardown %s" % self.tf_root_module)
         try:
-            self.runner.destroy()
+            self.destroy(self.runner)
         except subprocess.CalledProcessError as e:
             if self.teardown_config == td.IGNORE:
                 return
-            raise TerraformCommandFailed from e
+            raise TerraformCommandFailed.from_process_error(e) from e
+
+    def destroy(self, runner):
+        """destroy a runner's module, journaling the teardown"""
+        journal = self.get_journal()
+        if journal:
+            journal.write(runner, self.tf_root_module, "destroying")
+        runner.destroy()
+        if journal:
+            journal.remove(runner.work_dir)
 
 
 class FixtureDecoratorFactory(object):
     """Generate fixture decorators on the fly."""
 
     scope_class_map = defaultdict(lambda: TerraformFixture)
+    # function scoped fixture class used for composite provisioning
+    composite_class = None
 
     # Make accessing teardown options easier for users
     TEARDOWN_IGNORE = td.IGNORE
@@ -461,15 +1154,19 @@ class FixtureDecoratorFactory(object):
 
     def __init__(self):
         self._fixtures = []
+        # module name -> fixture
+        self._index = {}
+        # pytest fixture name -> fixture
+        self._names = {}
 
     def get_fixtures(self):
         return list(self._fixtures)
 
     def get_fixture(self, name):
-        for f in self._fixtures:
-            if f.name == name:
-                return f
-        raise KeyError(name)
+        """return a fixture by its pytest fixture name or module name"""
+        if name in self._names:
+            return self._names[name]
+        return self._index[name]
 
     def __call__(
         self,
@@ -478,6 +1175,11 @@ class FixtureDecoratorFactory(object):
         replay=None,
         name=None,
         teardown=td.DEFAULT,
+        projection=None,
+        composite=None,
+        backend=None,
+        parallelism=None,
+        depends_on=None,
     ):
         # We have to hook into where fixture discovery will find
         # our fixtures, the easiest option is to store on the module that
@@ -488,19 +1190,23 @@ class FixtureDecoratorFactory(object):
         # on the other.
         f = sys._getframe(1)
         name = name or terraform_dir
-        test_dir = local(_frame_path(f)).dirpath()
+        # decorators are applied in module or class bodies, whose globals
+        # are the test module's, avoiding a walk of the stack.
+        test_dir = local(f.f_globals.get("__file__") or _frame_path(f)).dirpath()
         if replay is None:
             replay = LazyReplay.resolve()
-        found = None
-        for tf in self._fixtures:
-            if tf.tf_root_module == terraform_dir:
-                assert scope == tf.scope, (
-                    "Same tf module:%s used at different scopes"
-                ) % (terraform_dir)
-                found = tf
+        found = self._index.get(terraform_dir)
         if found:
+            assert scope == found.scope, (
+                f"Same tf module:{terraform_dir} used at different scopes"
+            )
             return self.nonce_decorator
+        if composite is None:
+            composite = LazyComposite.resolve(False)
         tclass = self.scope_class_map[scope]
+        # composite groups can't pass upstream outputs per module
+        if composite and scope == "function" and self.composite_class and not depends_on:
+            tclass = self.composite_class
         tfix = tclass(
             LazyTfBin,
             LazyPluginCacheDir,
@@ -510,18 +1216,50 @@ class FixtureDecoratorFactory(object):
             replay,
             teardown,
             PytestConfig.resolve(),
+            projection=projection,
+            backend=backend,
+            parallelism=parallelism,
+            depends_on=depends_on,
         )
+        tfix.fixture_name = name
         self._fixtures.append(tfix)
+        self._index[terraform_dir] = tfix
+        self._names[name] = tfix
         marker = pytest.fixture(scope=scope, name=name)
-        f.f_locals[name] = marker(tfix)
+        f.f_locals[name] = marker(_with_upstream(tfix) if depends_on else tfix)
         return self.nonce_decorator
 
+    def dependents(self, name):
+        """return the names of fixtures depending on the named fixture"""
+        return [f.fixture_name for f in self._fixtures if name in f.depends_on]
+
     @staticmethod
     def nonce_decorator(func):
         pytest.mark.terraform(func)
         return func
 
 
+def _with_upstream(tfix):
+    """wrap a fixture to request its upstream fixtures from pytest
+
+    such that upstream fixtures are set up first and torn down last, and
+    tests using the fixture depend on its upstream as well.
+    """
+
+    def fixture(request, tmpdir_factory, worker_id, **upstream):
+        tfix.upstream = upstream
+        return tfix(request, tmpdir_factory, worker_id)
+
+    fixture.__signature__ = inspect.Signature(
+        [
+            inspect.Parameter(n, inspect.Parameter.POSITIONAL_OR_KEYWORD)
+            for n in ("request", "tmpdir_factory", "worker_id") + tfix.depends_on
+        ]
+    )
+    fixture.__name__ = tfix.name
+    return fixture
+
+
 def _frame_path(f):
     start = f
     while f:
@@ -0,0 +1,65 @@
+# Copyright 2020 Kapil Thangavelu
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Event trace of the plugin's coordination, for benchmarking.
+
+When enabled each process (xdist controller and workers) appends json
+lines to the same trace file, ie.
+
+    {"ts": 1700000000.1, "wid": "gw0", "event": "lock_wait", ...}
+
+lines are written with a single append, so concurrent writers don't
+interleave.
+"""
+
+import contextlib
+import json
+import os
+import time
+
+
+class Tracer:
+    def __init__(self):
+        self.fd = None
+        self.wid = "master"
+
+    @property
+    def enabled(self):
+        return self.fd is not None
+
+    def open(self, path, wid="master"):
+        self.wid = wid
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def event(self, event, **fields):
+        if self.fd is None:
+            return
+        fields.update(ts=time.time(), wid=self.wid, event=event)
+        os.write(self.fd, (json.dumps(fields) + "\n").encode("utf8"))
+
+    @contextlib.contextmanager
+    def span(self, event, **fields):
+        """trace an event with the duration of the block, at its end"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.event(event, duration=time.perf_counter() - start, **fields)
+
+
+tracer = Tracer()
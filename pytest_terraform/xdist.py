@@ -12,10 +12,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
 import os
+import subprocess
+import time
 
-from pytest_terraform import tf
+import pytest
+from py.path import local
+
+from pytest_terraform import dag, tf
+from pytest_terraform.exceptions import InvalidOption
 from pytest_terraform.lock import lock_create, lock_delete
+from pytest_terraform.report import report
+from pytest_terraform.trace import tracer
+
+# seconds between checks for a fixture provisioned by the controller
+ReadyPollInterval = 0.1
+ProvisionTimeout = 3600
+ProvisionWorkers = 8
 
 
 class ScopedTerraformFixture(tf.TerraformFixture):
@@ -25,13 +39,50 @@ class ScopedTerraformFixture(tf.TerraformFixture):
 
     state_dir = None
     wid = None
+    # provisioned and destroyed by the controller, workers only load
+    # the published snapshot.
+    controller = False
     _AutoTearDown = False
 
+    @property
+    def snapshot_path(self):
+        return self.state_dir / f"{self.name}.snapshot"
+
+    @property
+    def error_path(self):
+        return self.state_dir / f"{self.name}.error"
+
+    def __call__(self, request, tmpdir_factory, worker_id):
+        if not self.controller or self.replay:
+            return super().__call__(request, tmpdir_factory, worker_id)
+        self.resolve_module_dir()
+        return self.wait_provisioned()
+
+    def wait_provisioned(self, timeout=ProvisionTimeout):
+        """wait on the controller to publish the fixture's snapshot"""
+        start = time.perf_counter()
+        while not self.snapshot_path.exists():
+            if self.error_path.exists():
+                raise tf.TerraformCommandFailed(self.error_path.read_text("utf8"))
+            if time.perf_counter() - start > timeout:
+                raise tf.TerraformCommandFailed(
+                    f"timed out waiting on the controller to provision {self.name}"
+                )
+            time.sleep(ReadyPollInterval)
+        wait = time.perf_counter() - start
+        report.add("xdist", "provision wait seconds", wait)
+        tracer.event("provision_wait", fixture=self.name, duration=wait)
+        return tf.TerraformTestApi.from_snapshot(self.snapshot_path)
+
     def create(self, request, module_dir):
         if self.replay:
             super().create(request, module_dir)
 
+        start = time.perf_counter()
         with lock_create(self.state_dir / self.name) as (success, result):
+            wait = time.perf_counter() - start
+            report.add("xdist", "lock wait seconds", wait)
+            tracer.event("lock_wait", fixture=self.name, duration=wait, created=success)
             if success:
                 tf.write_log(
                     "%s create %s - success: %s" % (self.wid, self.name, success)
@@ -39,13 +90,16 @@ class ScopedTerraformFixture(tf.TerraformFixture):
                 tf_test_api = super(ScopedTerraformFixture, self).create(
                     request, module_dir
                 )
+                # publish the unmodified state for the other workers, before
+                # the pointer file is visible.
+                tf_test_api.snapshot(self.snapshot_path)
                 result.write(self.runner.work_dir.encode("utf8"))
                 return tf_test_api
-            return tf.TerraformTestApi.load(
-                os.path.join(self.resolve_module_dir(), "tf_resources.json")
-            )
+            return tf.TerraformTestApi.from_snapshot(self.snapshot_path)
 
     def tear_down(self):
+        if self.controller:
+            return
         # print('%s %s fix teardown' % (self.wid, self.name), file=sys.stderr)
         with lock_delete(self.state_dir / self.name) as success:
             #  print('%s %s teardown state:%s' % (
@@ -56,7 +110,8 @@ class ScopedTerraformFixture(tf.TerraformFixture):
             tf.write_log("%s teardown %s work-dir %s" % (self.wid, self.name, success))
             super(ScopedTerraformFixture)
             runner = self.get_runner(self.resolve_module_dir(), work_dir)
-            runner.destroy()
+            with tracer.span("teardown", fixture=self.name):
+                self.destroy(runner)
 
 
 class XDistTerraform(object):
@@ -70,6 +125,7 @@ class XDistTerraform(object):
 
         self.fixture_map = None  # only on worker nodes
         self.tracked_fixtures = set()  # only on worker nodes
+        self.teardown_rank = {}  # only on worker nodes
         self.completed = set()  # only on worker nodes
         self.test_log = None  # read only fh on worker nodes, append fh on master
         self.activity = []
@@ -90,6 +146,12 @@ class XDistTerraform(object):
 
         ScopedTerraformFixture.state_dir = self.state_dir
         ScopedTerraformFixture.wid = self.wid
+        ScopedTerraformFixture.controller = config.getoption(
+            "dest_tf_xdist_controller"
+        ) or config.getini("terraform-xdist-controller")
+        self.provisioner = None
+        if self.wid == "master" and ScopedTerraformFixture.controller:
+            self.provisioner = ControllerProvisioner(config, self.state_dir)
 
         log_path = str(self.state_dir / "completed-log.txt")
         # print(log_path)
@@ -107,17 +169,61 @@ class XDistTerraform(object):
         return fixture_map
 
     # worker hooks
+    @pytest.hookimpl(tryfirst=True)
     def pytest_collection_finish(self, session):
         """write out the collections of fixtures -> test ids
 
-        in xdist this is only called from the workers
+        in xdist this is only called from the workers, with controller
+        provisioning the spec is written before the controller is told
+        collection finished.
         """
+        fixtures = tf.terraform.get_fixtures()
         self.tracked_fixtures = {
-            t.name
-            for t in tf.terraform.get_fixtures()
-            if isinstance(t, ScopedTerraformFixture)
+            t.name for t in fixtures if isinstance(t, ScopedTerraformFixture)
         }
+        # dependents are torn down before their upstream fixtures, invalid
+        # dependencies are reported by the plugin's collection hook.
+        by_name = {t.fixture_name: t for t in fixtures}
+        try:
+            order = dag.order(dag.graph(fixtures))
+        except InvalidOption:
+            order = list(by_name)
+        self.teardown_rank = {by_name[n].name: i for i, n in enumerate(reversed(order))}
         self.fixture_map = self.generate_fixture_map(session.items)
+        if ScopedTerraformFixture.controller:
+            self.write_spec()
+        tracer.event("worker_start", tests=len(session.items))
+
+    def write_spec(self):
+        """write the fixtures for the controller to provision"""
+        spec = []
+        for name, nodeids in self.fixture_map.items():
+            f = tf.terraform.get_fixture(name)
+            if f.replay:
+                continue
+            try:
+                module_dir = f.resolve_module_dir()
+            except tf.ModuleNotFound:
+                continue
+            spec.append(
+                {
+                    "name": f.name,
+                    "fixture_name": f.fixture_name,
+                    "depends_on": list(f.depends_on),
+                    "scope": f.scope,
+                    "module_dir": str(module_dir),
+                    "test_dir": str(f.test_dir),
+                    "teardown": f.teardown_config,
+                    "projection": f.projection,
+                    "backend": f.backend,
+                    "parallelism": f.parallelism,
+                    "nodeids": sorted(nodeids),
+                }
+            )
+        path = str(self.state_dir / f"spec-{self.wid}.json")
+        with open(path + ".tmp", "w") as fh:
+            json.dump(spec, fh)
+        os.replace(path + ".tmp", path)
 
     def pytest_runtest_teardown(self, item, nextitem):
         found = []
@@ -126,11 +232,16 @@ class XDistTerraform(object):
                 found.append(f)
         if not found:
             return
+        found.sort(key=self.teardown_rank.get)
         # print(
         #    '%s worker teardown found: %s item used:%s tracked:%s' % (
         #    self.wid, found, item.fixturenames, self.tracked_fixtures), file=sys.stderr)
 
+        start = time.perf_counter()
         completed = {n.strip() for n in self.test_log_reader.readlines()}
+        elapsed = time.perf_counter() - start
+        report.add("xdist", "completed log seconds", elapsed)
+        tracer.event("log_read", duration=elapsed, lines=len(completed))
         self.completed.update(completed)
         self.completed.add(item.nodeid)
         # print("%s check teardown item:%s fixtures:%s completd:%s" % (
@@ -145,12 +256,15 @@ class XDistTerraform(object):
                 tf.write_log(
                     "%s execute test:%s teardown %s" % (self.wid, item.nodeid, f),
                 )
-                tf.terraform.get_fixture(f).tear_down()
+                self.tear_down(f)
                 self.fixture_map.pop(f)
 
     def pytest_sessionfinish(self, exitstatus):
         if self.wid == "master":
             # print("master session finish", file=sys.stderr)
+            if self.provisioner:
+                self.provisioner.finish()
+            report.load(self.state_dir / "report-*.json")
             return
 
         completed = {n.strip() for n in self.test_log_reader.readlines()}
@@ -162,28 +276,228 @@ class XDistTerraform(object):
         #            self.wid, self.fixture_map), file=sys.stderr)
 
         remains = []
-        for f in self.tracked_fixtures:
+        for f in sorted(self.tracked_fixtures, key=self.teardown_rank.get):
             if f not in self.fixture_map:
                 continue
             if self.completed.issuperset(self.fixture_map[f]):
                 tf.write_log("%s worker session down cleanup %s" % (self.wid, f))
-                tf.terraform.get_fixture(f).tear_down()
+                self.tear_down(f)
             else:
                 remains.append(str((f, self.fixture_map[f].difference(self.completed))))
         if remains:
             tf.write_log("%s tf remains %s" % (self.wid, remains))
+        tracer.event("worker_finish")
+        report.dump(str(self.state_dir / f"report-{self.wid}.json"))
+
+    def tear_down(self, name):
+        """tear down a fixture after its dependents
+
+        all tests of a dependent use its upstream fixture as well, so they
+        are done, but may be torn down by another worker. the teardown lock
+        waits on that, a dependent already torn down is skipped.
+        """
+        fixture = tf.terraform.get_fixture(name)
+        for fixture_name in tf.terraform.dependents(fixture.fixture_name):
+            dependent = tf.terraform.get_fixture(fixture_name)
+            if dependent.name in self.tracked_fixtures:
+                self.tear_down(dependent.name)
+        fixture.tear_down()
 
     # master hooks
     def pytest_report_teststatus(self, report, config):
         # only called from master
         if self.wid != "master" or report.when != "call":
             return
+        start = time.perf_counter()
         self.test_log_writer.write(("%s\n" % report.nodeid).encode("utf8"))
         self.test_log_writer.flush()
         os.fsync(self.test_log_writer.fileno())
+        tracer.event(
+            "log_write", duration=time.perf_counter() - start, nodeid=report.nodeid
+        )
+
+    def pytest_runtest_logreport(self, report):
+        if self.provisioner and report.when == "teardown":
+            self.provisioner.completed(report.nodeid)
+        # test phase durations on workers, for idle time
+        if self.wid != "master" and tracer.enabled:
+            tracer.event(
+                "test", nodeid=report.nodeid, when=report.when, duration=report.duration
+            )
 
     def pytest_configure_node(self, node):
         if not node.gateway.spec.popen:
             raise RuntimeError(
                 "terraform plugin only compatible with xdist multi-process"
             )
+
+    def pytest_xdist_node_collection_finished(self, node, ids):
+        if self.provisioner:
+            self.provisioner.add_spec(self.state_dir / f"spec-{node.gateway.id}.json")
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if self.provisioner and self.provisioner.failures:
+            terminalreporter.write_sep("-", "terraform controller teardown failures")
+            for name, error in self.provisioner.failures:
+                terminalreporter.write_line(
+                    "{}: {}".format(name, str(error).split("\n", 1)[0] or repr(error))
+                )
+
+
+class FinalizerRequest:
+    """collects the finalizers of a fixture created outside of a test"""
+
+    def __init__(self):
+        self.finalizers = []
+
+    def addfinalizer(self, func):
+        self.finalizers.append(func)
+
+
+class Provisioned:
+    def __init__(self, fixture, nodeids, future, request, upstream=()):
+        self.fixture = fixture
+        self.nodeids = nodeids
+        self.future = future
+        self.request = request
+        self.upstream = list(upstream)
+        self.dependents = []
+        self.torn_down = False
+        self.teardown_future = None
+
+
+class ControllerProvisioner:
+    """provisions shared fixtures in the xdist controller
+
+    workers write a spec of the non replay shared fixtures used by their
+    tests, the controller provisions them concurrently as each worker
+    finishes collection, publishing a snapshot (or error) for workers to
+    load. fixtures are destroyed once all their tests have finished.
+
+    fixtures are submitted in topological order, and wait on their
+    upstream fixtures' provisioning, as dependents' teardown waits on
+    theirs. as the pool runs tasks in submission order, a task only
+    waits on earlier tasks.
+    """
+
+    def __init__(self, config, state_dir, workers=ProvisionWorkers):
+        self.config = config
+        self.state_dir = state_dir
+        self.workers = workers
+        self.pool = None
+        self.provisioned = {}
+        self.done = set()
+        self.failures = []
+
+    def add_spec(self, path):
+        if not path.exists():
+            return
+        with open(str(path)) as fh:
+            spec = {s["fixture_name"]: s for s in json.load(fh)}
+        # upstream fixtures not in the spec (ie. replayed) aren't provisioned
+        deps = dag.subgraph({n: s["depends_on"] for n, s in spec.items()}, spec)
+        by_fixture = {p.fixture.fixture_name: p for p in self.provisioned.values()}
+        for fixture_name in dag.order(deps):
+            s = spec[fixture_name]
+            if s["name"] in self.provisioned:
+                continue
+            if self.pool is None:
+                from concurrent.futures import ThreadPoolExecutor
+
+                self.pool = ThreadPoolExecutor(max_workers=self.workers)
+            fixture = tf.TerraformFixture(
+                tf.LazyTfBin,
+                tf.LazyPluginCacheDir,
+                s["scope"],
+                s["name"],
+                local(s["test_dir"]),
+                False,
+                s["teardown"],
+                self.config,
+                projection=s["projection"],
+                backend=s["backend"],
+                parallelism=s["parallelism"],
+            )
+            fixture.fixture_name = fixture_name
+            # temp dir numbering isn't thread safe
+            work_dir = fixture.make_work_dir(self.config._tmpdirhandler)
+            request = FinalizerRequest()
+            upstream = [by_fixture[u] for u in deps[fixture_name]]
+            future = self.pool.submit(
+                self.provision,
+                fixture,
+                local(s["module_dir"]),
+                work_dir,
+                request,
+                upstream,
+            )
+            p = Provisioned(fixture, set(s["nodeids"]), future, request, upstream)
+            for u in upstream:
+                u.dependents.append(p)
+            self.provisioned[s["name"]] = by_fixture[fixture_name] = p
+        self.check_teardown()
+
+    def provision(self, fixture, module_dir, work_dir, request, upstream=()):
+        try:
+            fixture.upstream = {
+                u.fixture.fixture_name: u.future.result() for u in upstream
+            }
+            fixture.write_upstream(work_dir)
+            fixture._projection = fixture.get_projection()
+            # concurrent provisioning would interleave terraform's output,
+            # the tail of a failed command is published in the error instead.
+            fixture.runner = fixture.get_runner(module_dir, work_dir, stream_output=False)
+            with tracer.span("provision", fixture=fixture.name):
+                test_api = fixture.create(request, module_dir)
+            test_api.snapshot(self.state_dir / f"{fixture.name}.snapshot")
+        except Exception as e:
+            if isinstance(e, subprocess.CalledProcessError):
+                e = tf.TerraformCommandFailed.from_process_error(e)
+            error_path = str(self.state_dir / f"{fixture.name}.error")
+            with open(error_path + ".tmp", "w") as fh:
+                fh.write(f"{fixture.name}: {e}")
+            os.replace(error_path + ".tmp", error_path)
+            raise
+        report.add("xdist", "controller provisioned")
+        return test_api
+
+    def completed(self, nodeid):
+        self.done.add(nodeid)
+        self.check_teardown()
+
+    def check_teardown(self):
+        # dependents first, provisioned is in topological order
+        for p in reversed(list(self.provisioned.values())):
+            if (
+                not p.torn_down
+                and p.nodeids.issubset(self.done)
+                and all(d.torn_down for d in p.dependents)
+            ):
+                self.tear_down(p)
+
+    def tear_down(self, p):
+        p.torn_down = True
+        p.teardown_future = self.pool.submit(self._tear_down, p)
+
+    def _tear_down(self, p):
+        from concurrent.futures import wait
+
+        # only wait on them, provisioning failures are reported to the tests
+        # by workers, and teardown failures by finish.
+        wait([p.future] + [d.teardown_future for d in p.dependents])
+        with tracer.span("teardown", fixture=p.fixture.name):
+            for func in reversed(p.request.finalizers):
+                func()
+
+    def finish(self):
+        """tear down all remaining fixtures, and wait on the pool"""
+        if self.pool is None:
+            return
+        for p in reversed(list(self.provisioned.values())):
+            if not p.torn_down:
+                self.tear_down(p)
+        for name, p in self.provisioned.items():
+            error = p.teardown_future.exception()
+            if error is not None:
+                self.failures.append((name, error))
+        self.pool.shutdown()
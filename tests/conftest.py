@@ -1 +1,140 @@
+import json
+import sys
+
+import pytest
+
 pytest_plugins = "pytester"
+
+
+FakeTerraformScript = """#!%s
+import json, os, sys
+with open(%r) as fh:
+    config = json.load(fh)
+args = sys.argv[1:]
+module = os.path.basename(os.getcwd())
+line = list(args) if config["log_args"] else [args[0]]
+if config["label"] == "module":
+    line.insert(0, module)
+elif config["label"] == "worker":
+    line.insert(0, os.environ.get("PYTEST_XDIST_WORKER", "controller"))
+if config["log_var_file"]:
+    line.extend(open(a[10:]).read() for a in args if a.startswith("-var-file="))
+line.extend(f"{e}={os.environ.get(e)}" for e in config["log_env"])
+with open(config["log"], "a") as fh:
+    fh.write(" ".join(line) + "\\n")
+with open(config["log"]) as fh:
+    calls = fh.read().splitlines()
+exec(config["script"])
+data_dir = os.environ.get("TF_DATA_DIR", ".terraform")
+if args[0] == "init":
+    os.makedirs(data_dir, exist_ok=True)
+    if config["data_dir_state"]:
+        open(os.path.join(data_dir, "terraform.tfstate"), "w")
+if args[0] == "version":
+    print(json.dumps({"terraform_version": "1.5.0", "platform": "linux_amd64"}))
+if args[:2] == ["providers", "mirror"]:
+    platform = [a for a in args if a.startswith("-platform=")][0][10:]
+    for source, version in config["providers"].items():
+        namespace, name = source.split("/")
+        target = os.path.join(args[-1], "registry.terraform.io", namespace, name)
+        os.makedirs(target, exist_ok=True)
+        zip_name = f"terraform-provider-{name}_{version}_{platform}.zip"
+        open(os.path.join(target, zip_name), "w")
+if args[0] == "show":
+    json.dump({"values": {"outputs": config["outputs"]}}, sys.stdout)
+if args[0] == "apply":
+    if module in config["fail"]:
+        print("Error: creating file: permission denied")
+        sys.exit(1)
+    state_path = [a for a in args if a.startswith("-state=")][0][7:]
+    state = {
+        "version": 4,
+        "resources": config["resources"],
+        "outputs": config["outputs"],
+    }
+    with open(os.path.normpath(state_path), "w") as fh:
+        json.dump(state, fh)
+"""
+
+FakeResources = [
+    {
+        "mode": "managed",
+        "type": "local_file",
+        "name": "file",
+        "instances": [{"attributes": {"id": "f", "content": "recorded"}}],
+    }
+]
+
+
+class FakeTerraform:
+    """a fake terraform binary, logging its commands
+
+    each command is logged as a line of its name, or all its args with
+    log_args, prefixed per label by the module dir's name (`module`) or
+    the xdist worker id (`worker`), and followed by the contents of var
+    files if log_var_file is set and the values of the log_env variables.
+
+    script is python run after logging, with args, module and the logged
+    calls in scope, to exit early or misbehave. init then creates the
+    data dir, version reports a platform, providers mirror writes the
+    given providers' archives, show prints the outputs, and apply writes
+    a state of the given resources and outputs, failing for modules named
+    in fail.
+    """
+
+    def __init__(
+        self,
+        root,
+        label=None,
+        log_args=False,
+        log_var_file=False,
+        log_env=(),
+        data_dir_state=False,
+        resources=FakeResources,
+        outputs=None,
+        fail=(),
+        providers=None,
+        script="",
+    ):
+        self.log = root.join("terraform.log")
+        config = root.join("terraform.json")
+        config.write(
+            json.dumps(
+                {
+                    "log": self.log.strpath,
+                    "label": label,
+                    "log_args": log_args,
+                    "log_var_file": log_var_file,
+                    "log_env": list(log_env),
+                    "data_dir_state": data_dir_state,
+                    "resources": resources,
+                    "outputs": outputs or {},
+                    "fail": list(fail),
+                    "providers": providers or {},
+                    "script": script,
+                }
+            )
+        )
+        stub = root.join("terraform")
+        stub.write(FakeTerraformScript % (sys.executable, config.strpath))
+        stub.chmod(0o755)
+        self.path = stub.strpath
+
+    def calls(self, clear=False):
+        """return the logged command lines"""
+        if not self.log.exists():
+            return []
+        calls = self.log.read().splitlines()
+        if clear:
+            self.log.remove()
+        return calls
+
+
+@pytest.fixture
+def fake_terraform(tmpdir_factory):
+    """return a factory of FakeTerraform binaries"""
+
+    def make(**config):
+        return FakeTerraform(tmpdir_factory.mktemp("fake-terraform"), **config)
+
+    return make
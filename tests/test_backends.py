@@ -0,0 +1,85 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from pytest_terraform import register_backend, tf
+from pytest_terraform.backends import get_backend, get_backends
+from pytest_terraform.exceptions import InvalidOption
+from pytest_terraform.snapshot import SnapshotRunner
+
+NullResources = [
+    {
+        "mode": "managed",
+        "type": "null_resource",
+        "name": "x",
+        "instances": [{"attributes": {"id": "123"}}],
+    }
+]
+
+
+def test_backend_registry():
+    assert get_backend() is tf.TerraformRunner
+    assert get_backend("snapshot") is SnapshotRunner
+
+    @register_backend("test-pool")
+    class PoolRunner(tf.TerraformRunner):
+        pass
+
+    assert get_backends()["test-pool"] is PoolRunner
+    with pytest.raises(InvalidOption):
+        get_backend("missing")
+
+
+def test_fixture_backend_selection():
+    fixture = tf.TerraformFixture(
+        tf_bin="fakebin",
+        plugin_cache="fakecache",
+        scope="function",
+        tf_root_module="fakeroot",
+        test_dir="fakedir",
+        replay=False,
+        teardown=tf.td.ON,
+        pytest_config=MagicMock(),
+        backend="snapshot",
+    )
+    tf.LazyTfBin.value, orig = "terraform", tf.LazyTfBin.value
+    try:
+        assert isinstance(fixture.get_runner("mod", "work"), SnapshotRunner)
+    finally:
+        tf.LazyTfBin.value = orig
+
+
+def test_snapshot_runner(tmpdir, monkeypatch, fake_terraform):
+    stub = fake_terraform(data_dir_state=True, resources=NullResources)
+    monkeypatch.setattr(tf.LazySnapshotDir, "value", tmpdir.join("snapshots").strpath)
+    module_dir = tmpdir.join("module")
+    module_dir.join("main.tf").ensure()
+
+    def run(name):
+        runner = SnapshotRunner(
+            tmpdir.join(name, "work").strpath,
+            module_dir=module_dir.strpath,
+            tf_bin=stub.path,
+            stream_output=False,
+        )
+        runner.init()
+        state = runner.apply()
+        runner.destroy()
+        return runner, state
+
+    runner, state = run("first")
+    assert state["x"] == "123"
+    assert stub.calls() == ["init", "plan", "apply"]
+
+    runner, state = run("second")
+    assert runner.restored
+    assert state["x"] == "123"
+    assert stub.calls() == ["init", "plan", "apply"]
+    assert tmpdir.join("second", "work", "terraform.tfstate").exists()
+    assert json.loads(tmpdir.join("second", "terraform.tfstate").read())["version"] == 4
+
+    # changing the module captures a new snapshot
+    module_dir.join("main.tf").write("# changed")
+    run("third")
+    assert stub.calls()[3:] == ["init", "plan", "apply"]
@@ -0,0 +1,146 @@
+import os
+import time
+
+from pytest_terraform import tf
+from pytest_terraform.cache import PluginCache, ProviderMirror
+from pytest_terraform.report import report
+
+
+def add_provider(root, ptype, version, size=10, mtime=None):
+    path = root.join("registry.terraform.io", "hashicorp", ptype, version, "linux_amd64")
+    path.ensure(dir=True)
+    path.join(f"terraform-provider-{ptype}").write("x" * size)
+    if mtime:
+        os.utime(path.strpath, (mtime, mtime))
+    return path
+
+
+def test_cache_providers(tmpdir):
+    cache = PluginCache(tmpdir.join("cache"))
+    assert cache.providers() == set()
+    add_provider(tmpdir.join("cache"), "local", "2.4.0")
+    assert cache.providers() == {
+        os.path.join(
+            "registry.terraform.io", "hashicorp", "local", "2.4.0", "linux_amd64"
+        )
+    }
+
+
+def test_cache_record_init(tmpdir):
+    cache_dir = tmpdir.join("cache")
+    cache = PluginCache(cache_dir)
+    cached = add_provider(cache_dir, "local", "2.4.0", mtime=1)
+    before = cache.providers()
+    add_provider(cache_dir, "null", "3.2.0")
+
+    # terraform links installed providers from the cache into the data dir
+    data_dir = tmpdir.join("data")
+    for p in cache.providers():
+        link = data_dir.join("providers", p)
+        link.dirpath().ensure(dir=True)
+        os.symlink(cache_dir.join(p).strpath, link.strpath)
+
+    hits = report.get("plugin cache", "hits")
+    misses = report.get("plugin cache", "misses")
+    cache.record_init(before, data_dir.strpath)
+    assert report.get("plugin cache", "hits") == hits + 1
+    assert report.get("plugin cache", "misses") == misses + 1
+    assert cached.mtime() > 1
+
+
+def test_cache_evict(tmpdir):
+    cache_dir = tmpdir.join("cache")
+    now = time.time()
+    oldest = add_provider(cache_dir, "aws", "5.0.0", size=100, mtime=now - 300)
+    older = add_provider(cache_dir, "aws", "5.1.0", size=100, mtime=now - 200)
+    newest = add_provider(cache_dir, "aws", "5.2.0", size=100, mtime=now - 100)
+    only = add_provider(cache_dir, "local", "2.4.0", size=100, mtime=now - 400)
+
+    cache = PluginCache(cache_dir)
+    assert cache.evict(250) == 200
+    assert not oldest.exists()
+    assert not older.exists()
+    assert newest.exists()
+    assert only.exists()
+    assert cache.evict(0) == 0
+
+
+def test_runner_init_plugin_cache(tmpdir, fake_terraform):
+    stub = fake_terraform(log_env=["TF_PLUGIN_CACHE_DIR"])
+    cache_dir = tmpdir.join("cache")
+    trunner = tf.TerraformRunner(
+        tmpdir.strpath,
+        plugin_cache=cache_dir.strpath,
+        tf_bin=stub.path,
+        stream_output=False,
+    )
+    trunner.init()
+    assert cache_dir.join(".lock").exists()
+    assert stub.calls() == [f"init TF_PLUGIN_CACHE_DIR={cache_dir}"]
+
+
+def test_runner_init_warm_cache(tmpdir, fake_terraform):
+    stub = fake_terraform()
+    cache_dir = tmpdir.join("cache")
+    module_dir = tmpdir.mkdir("module")
+    module_dir.join(".terraform.lock.hcl").write(LOCK_FILE)
+    trunner = tf.TerraformRunner(
+        tmpdir.join("work").strpath,
+        module_dir=module_dir.strpath,
+        plugin_cache=cache_dir.strpath,
+        tf_bin=stub.path,
+        stream_output=False,
+    )
+    assert not PluginCache(cache_dir).warm(module_dir)
+    trunner.init()
+    assert cache_dir.join(".lock").exists()
+
+    # with the locked providers cached, init doesn't take the lock
+    cache_dir.join(".lock").remove()
+    add_provider(cache_dir, "null", "3.2.0")
+    assert PluginCache(cache_dir).warm(module_dir)
+    trunner.init()
+    assert not cache_dir.join(".lock").exists()
+
+
+LOCK_FILE = """
+provider "registry.terraform.io/hashicorp/null" {
+  version = "3.2.0"
+  hashes = [
+    "h1:abc=",
+  ]
+}
+"""
+
+
+def test_provider_mirror_init(tmpdir, fake_terraform):
+    stub = fake_terraform(log_args=True, providers={"hashicorp/null": "3.2.0"})
+
+    mod_a = tmpdir.join("mod_a").ensure(dir=True)
+    mod_a.join(".terraform.lock.hcl").write(LOCK_FILE)
+    mod_b = tmpdir.join("mod_b").ensure(dir=True)
+    mod_b.join(".terraform.lock.hcl").write(LOCK_FILE)
+
+    mirror = ProviderMirror(
+        tmpdir.join("mirror"), discover=lambda: [mod_a.strpath, mod_b.strpath]
+    )
+    for _ in range(2):
+        tf.TerraformRunner(
+            tmpdir.join("work").strpath,
+            module_dir=mod_a.strpath,
+            tf_bin=stub.path,
+            provider_mirror=mirror,
+            stream_output=False,
+        ).init()
+
+    commands = stub.calls()
+    # mirrored once for the first module, the second module's providers
+    # are then present, and init runs against the mirror.
+    assert [c.split(" ")[:2] for c in commands] == [
+        ["version", "-json"],
+        ["providers", "mirror"],
+        ["init", "-input=false"],
+        ["init", "-input=false"],
+    ]
+    assert commands[-1].endswith(f"-plugin-dir={mirror.path}")
+    assert mirror.missing(mod_b.join(".terraform.lock.hcl").strpath) == []
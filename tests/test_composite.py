@@ -0,0 +1,149 @@
+import json
+
+from pytest_terraform import composite
+from pytest_terraform.journal import Journal
+
+
+def composite_resources():
+    """state of the wrapper module of local_a and local_b"""
+    resources = []
+    outputs = {}
+    for name in ("local_a", "local_b"):
+        resources.append(
+            {
+                "module": "module." + name,
+                "mode": "managed",
+                "type": "local_file",
+                "name": "file",
+                "instances": [{"attributes": {"id": name, "content": name + "!"}}],
+            }
+        )
+        outputs[name] = {
+            "value": {"path": name + ".txt", "key": "secret"},
+            "type": ["object", {"path": "string", "key": "string"}],
+            "sensitive": True,
+        }
+    return {"resources": resources, "outputs": outputs}
+
+
+def test_render_wrapper(tmpdir):
+    class Fixture:
+        name = "local_a"
+
+        def resolve_module_dir(self):
+            return tmpdir
+
+    wrapper = json.loads(composite.render_wrapper([Fixture()]))
+    assert wrapper["module"] == {"local_a": {"source": str(tmpdir)}}
+    assert wrapper["output"]["local_a"]["value"] == "${module.local_a}"
+
+
+def test_composite_provision(testdir, fake_terraform):
+    stub = fake_terraform(**composite_resources())
+    for name in ("local_a", "local_b"):
+        testdir.tmpdir.join("terraform", name, "main.tf").write(
+            'output "key" {\n  value     = "secret"\n  sensitive = true\n}\n',
+            ensure=True,
+        )
+
+    testdir.makeini(
+        """
+        [pytest]
+        terraform-composite = true
+    """
+    )
+    testdir.makepyfile(
+        """
+        from pytest_terraform import terraform
+
+        @terraform("local_a", replay=False)
+        @terraform("local_b", replay=False)
+        def test_composite(local_a, local_b):
+            assert local_a["local_file.file.content"] == "local_a!"
+            assert local_b["local_file.file.content"] == "local_b!"
+            assert local_a.outputs == {
+                "path": {"value": "local_a.txt", "type": "string", "sensitive": False},
+                "key": {"value": "secret", "type": "string", "sensitive": True},
+            }
+            assert local_a.work_dir == local_b.work_dir
+    """
+    )
+    result = testdir.runpytest_subprocess(f"--tf-binary={stub.path}")
+    result.assert_outcomes(passed=1)
+    assert stub.calls() == ["init", "plan", "apply", "destroy"]
+
+    recorded = json.loads(
+        testdir.tmpdir.join("terraform", "local_b", "tf_resources.json").read()
+    )
+    assert recorded["resources"] == {
+        "local_file": {"file": {"id": "local_b", "content": "local_b!"}}
+    }
+
+
+def test_composite_named_journaled(testdir, fake_terraform):
+    stub = fake_terraform(**composite_resources())
+    for name in ("local_a", "local_b"):
+        testdir.tmpdir.join("terraform", name, "main.tf").ensure()
+
+    testdir.makepyfile(
+        """
+        from pytest_terraform import terraform
+        from pytest_terraform.journal import Journal
+
+        @terraform("local_a", name="a", replay=False, composite=True)
+        @terraform("local_b", name="b", replay=False, composite=True)
+        def test_composite(a, b):
+            assert a.work_dir == b.work_dir
+            (entry,) = Journal(".tfjournal").entries()
+            assert entry["status"] == "applied"
+            assert entry["module_dir"].endswith("module")
+    """
+    )
+    result = testdir.runpytest_subprocess(
+        f"--tf-binary={stub.path}", "--tf-journal=.tfjournal"
+    )
+    result.assert_outcomes(passed=1)
+    assert stub.calls() == ["init", "plan", "apply", "destroy"]
+    assert Journal(testdir.tmpdir.join(".tfjournal")).entries() == []
+
+
+def test_composite_mixed_teardown(testdir, fake_terraform):
+    # fixtures of another teardown mode aren't grouped with the leader's
+    stub = fake_terraform(label="module", **composite_resources())
+    for name in ("local_a", "local_b", "local_c"):
+        testdir.tmpdir.join("terraform", name, "main.tf").ensure()
+
+    testdir.makepyfile(
+        """
+        from pytest_terraform import terraform
+
+        @terraform("local_a", replay=False, composite=True)
+        @terraform("local_b", replay=False, composite=True, teardown="off")
+        @terraform("local_c", replay=False, composite=True)
+        def test_composite(local_a, local_b, local_c):
+            assert local_a.work_dir == local_c.work_dir
+            assert local_a.work_dir != local_b.work_dir
+    """
+    )
+    result = testdir.runpytest_subprocess(f"--tf-binary={stub.path}")
+    result.assert_outcomes(passed=1)
+    assert sorted(stub.calls()) == [
+        "local_b apply",
+        "local_b init",
+        "local_b plan",
+        "module apply",
+        "module destroy",
+        "module init",
+        "module plan",
+    ]
+
+
+def test_sensitive_outputs(tmpdir):
+    tmpdir.join("main.tf").write(
+        'output "id" {\n  value = local_file.f.id\n}\n'
+        'output "token" {\n  value     = random_id.t.hex\n  sensitive = true\n}\n'
+    )
+    tmpdir.join("extra.tf.json").write(
+        json.dumps({"output": {"key": {"value": "k", "sensitive": True}}})
+    )
+    assert composite.sensitive_outputs(tmpdir.strpath) == {"token", "key"}
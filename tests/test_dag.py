@@ -0,0 +1,44 @@
+import threading
+
+import pytest
+
+from pytest_terraform import dag
+from pytest_terraform.exceptions import InvalidOption
+
+
+def test_order():
+    deps = {"app": ("db", "net"), "db": ("net",), "net": ()}
+    assert dag.order(deps) == ["net", "db", "app"]
+    assert dag.reverse(deps) == {"app": (), "db": ("app",), "net": ("app", "db")}
+    assert dag.subgraph(deps, ["app", "db"]) == {"app": ("db",), "db": ()}
+
+
+def test_order_invalid():
+    with pytest.raises(InvalidOption, match="cycle: a -> b -> a"):
+        dag.order({"a": ("b",), "b": ("a",)})
+    with pytest.raises(InvalidOption, match="a depends on unknown fixture b"):
+        dag.order({"a": ("b",)})
+
+
+def test_run():
+    deps = {"net": (), "db": ("net",), "app": ("db",), "bad": (), "after": ("bad",)}
+    lock = threading.Lock()
+    called = []
+
+    def func(name, upstream):
+        with lock:
+            called.append(name)
+        if name == "bad":
+            raise ValueError("bad")
+        return sorted(upstream.items())
+
+    results, errors = dag.run(deps, func, 4)
+    assert results == {
+        "net": [],
+        "db": [("net", [])],
+        "app": [("db", [("net", [])])],
+    }
+    assert isinstance(errors["bad"], ValueError)
+    assert isinstance(errors["after"], dag.DependencyFailed)
+    assert "after" not in called
+    assert called.index("net") < called.index("db") < called.index("app")
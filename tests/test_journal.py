@@ -0,0 +1,70 @@
+import os
+
+from pytest_terraform.journal import Journal
+
+CRASH = """
+import os
+from pytest_terraform import terraform
+
+@terraform("local_a", replay=False)
+def test_crash(local_a):
+    os._exit(3)
+"""
+
+PASS = """
+from pytest_terraform import terraform
+
+@terraform("local_a", replay=False)
+def test_pass(local_a):
+    assert local_a["local_file.file.content"] == "recorded"
+"""
+
+
+def setup_stub(testdir, fake_terraform):
+    testdir.tmpdir.join("terraform", "local_a", "main.tf").ensure()
+    return fake_terraform()
+
+
+def test_journal_adopt(testdir, fake_terraform):
+    stub = setup_stub(testdir, fake_terraform)
+    args = (f"--tf-binary={stub.path}", "--tf-journal=.tfjournal")
+    journal = Journal(testdir.tmpdir.join(".tfjournal"))
+
+    testdir.makepyfile(test_journal=CRASH)
+    assert testdir.runpytest_subprocess(*args).ret == 3
+    assert stub.calls(clear=True) == ["init", "plan", "apply"]
+    (entry,) = journal.leftovers()
+    assert entry["module"] == "local_a" and entry["status"] == "applied"
+
+    # the crashed run's apply is adopted, and destroyed at teardown
+    testdir.makepyfile(test_journal=PASS)
+    result = testdir.runpytest_subprocess(*args)
+    result.assert_outcomes(passed=1)
+    result.stdout.fnmatch_lines(["journal: adopted 1"])
+    assert stub.calls(clear=True) == ["destroy"]
+    assert journal.entries() == []
+    assert not os.path.exists(entry["work_dir"])
+
+
+def test_journal_reap(testdir, fake_terraform):
+    stub = setup_stub(testdir, fake_terraform)
+    args = (f"--tf-binary={stub.path}", "--tf-journal=.tfjournal")
+    journal = Journal(testdir.tmpdir.join(".tfjournal"))
+
+    testdir.makepyfile(test_journal=CRASH)
+    assert testdir.runpytest_subprocess(*args).ret == 3
+    stub.calls(clear=True)
+    # a changed module isn't adopted
+    testdir.tmpdir.join("terraform", "local_a", "main.tf").write("# changed")
+    assert journal.adopt("local_a", journal.leftovers()[0]["module_dir"]) is None
+
+    result = testdir.runpytest_subprocess(*(args + ("--tf-reap",)))
+    assert result.ret == 0
+    result.stdout.fnmatch_lines(["journal: reaped 1"])
+    assert stub.calls(clear=True) == ["init", "destroy"]
+    assert journal.entries() == []
+
+
+def test_journal_reap_requires_journal(testdir):
+    result = testdir.runpytest("--tf-reap", "--tf-replay")
+    result.stderr.fnmatch_lines(["*--tf-reap requires a journal*"])
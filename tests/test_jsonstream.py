@@ -0,0 +1,103 @@
+import io
+import json
+import os
+
+import pytest
+
+from pytest_terraform import tf
+from pytest_terraform.jsonstream import JsonCursor
+
+DOC = {
+    "version": 4,
+    "numbers": [12345678901234567890, -1.5e10, 0, 12.25, 1e5, -0.5e-3],
+    "nested": {
+        "a": [True, False, None, {"x": 12.25, "y": [1e5, "]}\\\\"]}],
+        "b": {"c": 'caf\u00e9 "quoted" \\ {[', "d": 1.0},
+    },
+    "empty": [{}, [], ""],
+}
+DOC_TEXT = json.dumps(DOC, separators=(",", ":"))
+
+
+@pytest.mark.parametrize("binary", (True, False))
+@pytest.mark.parametrize("bufsize", range(1, 24))
+def test_cursor_read_value(binary, bufsize):
+    data = DOC_TEXT
+    fh = io.BytesIO(data.encode("utf8")) if binary else io.StringIO(data)
+    cursor = JsonCursor(fh, bufsize=bufsize)
+    assert cursor.read_value() == DOC
+    assert cursor.peek() == ""
+
+
+@pytest.mark.parametrize("bufsize", range(1, 24))
+def test_cursor_walk(bufsize):
+    cursor = JsonCursor(io.StringIO(DOC_TEXT), bufsize=bufsize)
+    seen = {}
+    for key in cursor.iter_map():
+        if key == "numbers":
+            seen[key] = [cursor.read_value() for _ in cursor.iter_array()]
+        elif key == "nested":
+            for idx in cursor.iter_map():
+                cursor.skip()
+            seen[key] = idx
+        elif key == "empty":
+            for idx in cursor.iter_array():
+                cursor.skip()
+            seen[key] = idx
+        else:
+            cursor.skip()
+    assert seen == {"numbers": DOC["numbers"], "nested": "b", "empty": 2}
+    assert cursor.peek() == ""
+
+
+def test_cursor_truncated():
+    cursor = JsonCursor(io.StringIO('{"a": [1, 2'), bufsize=4)
+    with pytest.raises(ValueError):
+        for key in cursor.iter_map():
+            list(cursor.iter_array())
+
+
+def test_state_stream_matches_string():
+    path = os.path.join(os.path.dirname(__file__), "burnify.tfstate")
+    with open(path) as fh:
+        expected = tf.TerraformState.parse_state(fh.read())
+    with open(path, "rb") as fh:
+        assert tf.TerraformState.parse_state_stream(fh) == expected
+
+    recorded = tf.TerraformState(*expected).save()
+    assert tf.TerraformState.parse_state_stream(io.StringIO(str(recorded))) == expected
+
+
+def test_state_stream_bad_file(tmpdir):
+    path = tmpdir.join("bad.tfstate")
+    path.write('{"resources": [{"type": ')
+    with pytest.raises(tf.InvalidState):
+        tf.TerraformState.from_file(path.strpath)
+
+
+def test_state_stream_skips_instances(monkeypatch):
+    # only the first instance of a counted resource is decoded
+    instances = [{"attributes": {"id": str(i)}} for i in range(3)]
+    state = {
+        "resources": [
+            {
+                "mode": "managed",
+                "type": "null_resource",
+                "name": "n",
+                "instances": instances,
+            }
+        ]
+    }
+    decoded = []
+    read_value = JsonCursor.read_value
+
+    def spy(cursor):
+        value = read_value(cursor)
+        decoded.append(value)
+        return value
+
+    monkeypatch.setattr(JsonCursor, "read_value", spy)
+    resources, _ = tf.TerraformState.parse_state_stream(io.StringIO(json.dumps(state)))
+    assert resources["null_resource"]["n"] == {"id": "0"}
+    assert instances[0] in decoded
+    assert instances[1] not in decoded and instances[2] not in decoded
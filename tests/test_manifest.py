@@ -0,0 +1,75 @@
+from pytest_terraform import tf
+from pytest_terraform.manifest import ReplayManifest, scan_root
+
+
+def test_scan_root(tmpdir):
+    tmpdir.join("recorded", "tf_resources.json").write("{}", ensure=True)
+    tmpdir.mkdir("unrecorded")
+    tmpdir.join("main.tf").write("")
+
+    entries = scan_root(tmpdir.strpath)
+    assert set(entries) == {"recorded", "unrecorded"}
+    recorded = entries["recorded"]
+    assert recorded.recording == tmpdir.join("recorded", "tf_resources.json").strpath
+    assert entries["unrecorded"].recording is None
+    assert scan_root(tmpdir.join("missing").strpath) == {}
+
+
+def test_manifest_lookup(tmpdir):
+    first = tmpdir.mkdir("first")
+    second = tmpdir.mkdir("second")
+    first.mkdir("aws_sqs")
+    second.join("aws_sqs", "tf_resources.json").write("{}", ensure=True)
+    second.mkdir("aws_sns")
+
+    manifest = ReplayManifest()
+    roots = [first, second]
+    assert manifest.lookup(roots, "aws_sqs").module_dir == first.join("aws_sqs")
+    assert manifest.lookup(roots, "aws_sns").module_dir == second.join("aws_sns")
+    assert manifest.lookup(roots, "aws_sqs_dlq") is None
+
+    # roots are scanned once, later changes aren't seen
+    first.mkdir("aws_sqs_dlq")
+    assert manifest.lookup(roots, "aws_sqs_dlq") is None
+    assert len(list(manifest.entries())) == 3
+
+
+def test_manifest_replay_only(testdir, monkeypatch):
+    monkeypatch.setattr(tf.LazyManifest, "value", tf.LazyManifest.value)
+    monkeypatch.setattr(tf.LazyReplay, "value", None)
+    monkeypatch.setattr(tf.LazyTfBin, "value", tf.LazyTfBin.value)
+    testdir.parseconfigure("--tf-binary=terraform")
+    assert tf.LazyManifest.value is None
+    tf.LazyReplay.value = None
+    testdir.parseconfigure("--tf-replay")
+    assert isinstance(tf.LazyManifest.value, ReplayManifest)
+
+
+def test_manifest_missing_recording(testdir):
+    testdir.tmpdir.join("terraform", "local_a", "main.tf").ensure()
+    testdir.makepyfile(
+        """
+        from pytest_terraform import terraform
+
+        @terraform("local_a", replay=True)
+        def test_replay(local_a):
+            pass
+
+        @terraform("local_gone", replay=True)
+        def test_other(local_gone):
+            pass
+    """
+    )
+    result = testdir.runpytest_subprocess("--tf-replay")
+    assert result.ret == 4
+    result.stderr.fnmatch_lines(
+        [
+            (
+                "*terraform replay recordings missing: "
+                "local_a (not recorded), local_gone (module not found)"
+            )
+        ]
+    )
+    result = testdir.runpytest_subprocess("--tf-replay", "-k", "not replay")
+    assert result.ret == 4
+    result.stderr.fnmatch_lines(["*missing: local_gone (module not found)"])
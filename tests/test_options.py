@@ -38,3 +38,15 @@ def test_teardown_option_resolve_invalid():
     """If an option is invalid make sure an exception is raised"""
     tdo = options.TeardownOption()
     pytest.raises(options.InvalidTeardownMode, tdo.resolve, "INVALID---")
+
+
+def test_parse_timeouts():
+    assert options.parse_timeouts("") == {}
+    assert options.parse_timeouts("600") == {"default": 600}
+    assert options.parse_timeouts("default=60, apply=1800,destroy=900") == {
+        "default": 60,
+        "apply": 1800,
+        "destroy": 900,
+    }
+    with pytest.raises(options.InvalidOption):
+        options.parse_timeouts("apply=soon")
@@ -0,0 +1,74 @@
+import os
+
+from pytest_terraform import tf
+from pytest_terraform.projection import Projection
+from pytest_terraform.report import SessionReport
+
+
+def test_projection_includes():
+    p = Projection(["aws_sqs_queue.*.arn", "*.*.name"])
+    assert p.keep("aws_sqs_queue", "q", "arn")
+    assert p.keep("aws_sns_topic", "t", "name")
+    assert p.keep("aws_sns_topic", "t", "id")
+    assert not p.keep("aws_sns_topic", "t", "arn")
+
+
+def test_projection_excludes():
+    p = Projection(["!*.*.policy", "!aws_iam_role"])
+    assert p.keep("aws_sqs_queue", "q", "arn")
+    assert not p.keep("aws_sqs_queue", "q", "policy")
+    assert not p.keep("aws_iam_role", "r", "arn")
+    assert p.keep("aws_iam_role", "r", "id")
+
+
+def test_projection_string():
+    p = Projection("aws_sqs_queue.*.arn")
+    assert len(p.includes) == 1
+    assert p.keep("aws_sqs_queue", "q", "arn")
+    assert not p.keep("aws_sqs_queue", "q", "url")
+
+
+def test_projection_apply_saved():
+    p = Projection(["!*.*.policy"])
+    attrs = p.apply("t", "n", {"id": "x", "policy": "abc"})
+    assert attrs == {"id": "x"}
+    assert p.saved == len('"policy": "abc"')
+    assert Projection().apply("t", "n", {"policy": "abc"}) == {"policy": "abc"}
+
+
+def test_state_projection():
+    path = os.path.join(os.path.dirname(__file__), "burnify.tfstate")
+    full = tf.TerraformState.from_file(path)
+    projection = Projection(["aws_api_gateway_rest_api.*.name"])
+    state = tf.TerraformState.from_file(path, projection=projection)
+
+    assert len(state.resources) == len(full.resources)
+    assert state.resources["aws_api_gateway_rest_api"]["rest_api"] == {
+        "id": "7bnxriulj5",
+        "name": "burnify",
+    }
+    assert state.resources["aws_lambda_function"]["sfn_account_create_poll"] == {
+        "id": "burnify-dev-sfn_account_create_poll"
+    }
+    assert projection.saved > 0
+    assert len(str(state.save())) < len(str(full.save()))
+
+    with open(path) as fh:
+        assert (
+            tf.TerraformState.from_string(
+                fh.read(), projection=Projection(["aws_api_gateway_rest_api.*.name"])
+            ).resources
+            == state.resources
+        )
+
+
+def test_session_report_merge(tmpdir):
+    worker = SessionReport()
+    worker.add("projection bytes saved", "local_foo", 10)
+    worker.dump(tmpdir.join("report-gw0.json").strpath)
+
+    controller = SessionReport()
+    assert not controller
+    controller.add("projection bytes saved", "local_foo", 5)
+    controller.load(tmpdir.join("report-*.json"))
+    assert controller.get("projection bytes saved", "local_foo") == 15
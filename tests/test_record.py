@@ -0,0 +1,71 @@
+import json
+
+
+def test_record_only(testdir, fake_terraform):
+    stub = fake_terraform(label="module", fail=["local_bad"])
+    for name in ("local_a", "local_b", "local_bad"):
+        testdir.tmpdir.join("terraform", name, "main.tf").ensure()
+
+    testdir.makepyfile(
+        """
+        from pytest_terraform import terraform
+
+        @terraform("local_a", scope="session")
+        @terraform("local_b")
+        @terraform("local_bad")
+        def test_not_run(local_a, local_b, local_bad):
+            assert False
+    """
+    )
+    result = testdir.runpytest_subprocess(f"--tf-binary={stub.path}", "--tf-record-only")
+    assert result.ret == 1
+    result.stdout.fnmatch_lines(
+        [
+            "*terraform recording failures*",
+            "local_bad: terraform command failed with exit code 1*",
+        ]
+    )
+    result.stdout.no_fnmatch_line("*test_not_run*FAILED*")
+
+    calls = stub.calls()
+    for name in ("local_a", "local_b"):
+        assert [c.split()[1] for c in calls if c.startswith(name + " ")] == [
+            "init",
+            "plan",
+            "apply",
+            "destroy",
+        ]
+        recorded = json.loads(
+            testdir.tmpdir.join("terraform", name, "tf_resources.json").read()
+        )
+        assert recorded["resources"]["local_file"]["file"]["content"] == "recorded"
+    assert not testdir.tmpdir.join("terraform", "local_bad", "tf_resources.json").exists()
+
+
+def test_record_only_depends_on(testdir, fake_terraform):
+    stub = fake_terraform(label="module", log_var_file=True)
+    for name in ("local_net", "local_app"):
+        testdir.tmpdir.join("terraform", name, "main.tf").ensure()
+
+    testdir.makepyfile(
+        """
+        from pytest_terraform import terraform
+
+        @terraform("local_net", scope="session")
+        @terraform("local_app", scope="session", depends_on=["local_net"])
+        def test_not_run(local_app):
+            assert False
+    """
+    )
+    result = testdir.runpytest_subprocess(f"--tf-binary={stub.path}", "--tf-record-only")
+    assert result.ret == 0
+    assert stub.calls() == [
+        "local_net init",
+        "local_net plan",
+        "local_net apply",
+        "local_app init",
+        'local_app plan {"local_net": {}}',
+        "local_app apply",
+        'local_app destroy {"local_net": {}}',
+        "local_net destroy",
+    ]
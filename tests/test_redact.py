@@ -0,0 +1,113 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pytest_terraform.exceptions import InvalidOption
+from pytest_terraform.redact import Redactor
+from pytest_terraform.report import report
+from pytest_terraform.tf import TerraformState
+
+State = {
+    "pytest-terraform": 1,
+    "outputs": {"endpoint": {"value": "10.0.1.25", "type": "string"}},
+    "resources": {
+        "aws_iam_role": {
+            "app": {
+                "id": "app",
+                "arn": "arn:aws:iam::123456789012:role/app",
+                "unique_id": "AROAEXAMPLE",
+                "max_session_duration": 3600,
+                "tags": {"Owner": "alice", "Secret": "x"},
+                "policies": [{"db_password": "hunter2", "enabled": True}],
+            }
+        }
+    },
+}
+
+
+def test_redact_rules():
+    redactor = Redactor(
+        [
+            "key:*password*",
+            "key:Secret",
+            "path:resources.aws_iam_role.*.unique_id",
+            "path:resources.*.*.max_session_duration",
+            "pack:aws-arns",
+            "pack:ips",
+        ]
+    )
+    report.sections.clear()
+    redacted = redactor.redact(State)
+    role = redacted["resources"]["aws_iam_role"]["app"]
+    assert role["arn"] == "arn:aws:iam::000000000000:role/app"
+    assert role["unique_id"] == "REDACTED"
+    assert role["max_session_duration"] == 0
+    assert role["tags"] == {"Owner": "alice", "Secret": "REDACTED"}
+    assert role["policies"] == [{"db_password": "REDACTED", "enabled": True}]
+    assert redacted["outputs"]["endpoint"]["value"] == "192.0.2.0"
+    assert role["id"] == "app"
+    assert report.get("redaction", "values") == 6
+    # the original state is left as is
+    assert State["resources"]["aws_iam_role"]["app"]["unique_id"] == "AROAEXAMPLE"
+
+
+def test_redact_account_ids_pack():
+    redactor = Redactor(["pack:aws-account-ids"])
+    assert redactor.redact(
+        {
+            "owner_id": "123456789012",
+            "arn": "arn:aws:sns:us-east-1:123456789012:topic",
+            "url": "https://sqs.us-east-1.amazonaws.com/123456789012/queue",
+            "image": "123456789012.dkr.ecr.us-east-1.amazonaws.com/app:1",
+            "size": "123456789012",
+            "version": "20230101120000",
+        }
+    ) == {
+        "owner_id": "REDACTED",
+        "arn": "arn:aws:sns:us-east-1:000000000000:topic",
+        "url": "https://sqs.us-east-1.amazonaws.com/000000000000/queue",
+        "image": "000000000000.dkr.ecr.us-east-1.amazonaws.com/app:1",
+        "size": "123456789012",
+        "version": "20230101120000",
+    }
+
+
+def test_redact_arns_pack_only_arns():
+    redactor = Redactor(["pack:aws-arns"])
+    data = {
+        "arn": "arn:aws:iam::123456789012:role/app",
+        "owner_id": "123456789012",
+        "size": "123456789012",
+    }
+    assert redactor.redact(data) == dict(data, arn="arn:aws:iam::000000000000:role/app")
+
+
+def test_redact_report():
+    report.sections.clear()
+    Redactor(["key:arn"]).redact(State)
+    assert report.get("redaction", "values") == 1
+    assert report.get("redaction", "seconds") > 0
+    report.sections.clear()
+
+
+def test_redact_threads():
+    # a shared redactor counts each call's values on its own
+    report.sections.clear()
+    redactor = Redactor(["key:*password*", "pack:aws-arns", "pack:ips"])
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(redactor.redact, [State] * 200))
+    assert report.get("redaction", "values") == 600
+    report.sections.clear()
+
+
+def test_redact_export():
+    state = TerraformState(State["resources"], State["outputs"])
+    assert "123456789012" in str(state.export())
+    assert "123456789012" not in str(state.export(Redactor(["pack:aws-arns"])))
+    assert not Redactor([])
+
+
+@pytest.mark.parametrize("rule", ["arn", "key:", "pack:unknown", "value:(", "x:y"])
+def test_redact_invalid_rule(rule):
+    with pytest.raises(InvalidOption):
+        Redactor([rule])
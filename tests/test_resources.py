@@ -0,0 +1,113 @@
+import json
+
+import jmespath
+import pytest
+
+from pytest_terraform import tf
+from pytest_terraform.resources import (
+    ResourceMap,
+    ResourceRecord,
+    read_snapshot,
+    write_snapshot,
+)
+
+RESOURCES = {
+    "aws_sqs_queue": {
+        "queue": {"id": "q1", "tags": {"Environment": "production"}},
+        "dlq": {"id": "q2"},
+    },
+    "aws_sns_topic": {},
+}
+
+
+def test_resource_map_mapping():
+    rmap = ResourceMap(RESOURCES)
+    assert rmap == RESOURCES
+    assert rmap.to_dict() == RESOURCES
+    assert len(rmap) == 2
+    assert sorted(rmap["aws_sqs_queue"]) == ["dlq", "queue"]
+    assert rmap["aws_sqs_queue"].get("missing") is None
+    assert rmap.get("aws_lambda_function") is None
+
+    # attributes are decoded on access without being kept, assigned
+    # attributes are
+    assert isinstance(rmap["aws_sqs_queue"], dict)
+    assert rmap["aws_sqs_queue"]["queue"] is not rmap["aws_sqs_queue"]["queue"]
+    assert all(isinstance(v, ResourceRecord) for v in dict.values(rmap["aws_sqs_queue"]))
+    rmap["aws_sqs_queue"]["queue"] = dict(rmap["aws_sqs_queue"]["queue"], id="changed")
+    assert rmap["aws_sqs_queue"]["queue"]["id"] == "changed"
+    record = next(r for r in rmap.records() if r.name == "queue")
+    assert record.attributes["id"] == "changed"
+
+    rmap.setdefault("aws_sns_topic")["topic"] = {"id": "t1"}
+    assert rmap["aws_sns_topic"]["topic"] == {"id": "t1"}
+
+
+def test_resource_map_records():
+    rmap = ResourceMap(RESOURCES)
+    records = {(r.type, r.name): r for r in rmap.records()}
+    assert set(records) == {("aws_sqs_queue", "queue"), ("aws_sqs_queue", "dlq")}
+
+    record = records[("aws_sqs_queue", "dlq")]
+    assert isinstance(record, ResourceRecord)
+    assert not hasattr(record, "__dict__")
+    assert record.type is rmap["aws_sqs_queue"].type
+
+
+def test_resource_map_jmespath():
+    rmap = ResourceMap(RESOURCES)
+    assert jmespath.search("aws_sqs_queue.queue.tags", rmap) == {
+        "Environment": "production"
+    }
+    assert sorted(jmespath.search("aws_sqs_queue.*.id", rmap)) == ["q1", "q2"]
+
+    state = tf.TerraformState(RESOURCES, {})
+    assert state.get("aws_sqs_queue.dlq.id") == "q2"
+    assert sorted(state.get("values(aws_sqs_queue)[].id")) == ["q1", "q2"]
+    # lookups don't leave decoded attributes in the map
+    assert all(
+        isinstance(v, ResourceRecord)
+        for v in dict.values(state.resources["aws_sqs_queue"])
+    )
+    assert state.get("values(aws_sqs_queue)[].tags.Environment") == ["production"]
+
+
+def test_resource_map_json():
+    rmap = ResourceMap(RESOURCES)
+    assert json.loads(json.dumps(rmap)) == RESOURCES
+    assert json.loads(json.dumps(rmap, indent=2)) == RESOURCES
+    assert dict(rmap["aws_sqs_queue"]) == RESOURCES["aws_sqs_queue"]
+
+
+def test_state_compact_resources():
+    state = tf.TerraformState(RESOURCES, {})
+    assert isinstance(state.resources, ResourceMap)
+    assert state["dlq"] == "q2"
+    assert state["aws_sqs_queue.queue.tags.Environment"] == "production"
+    assert tf.TerraformState.from_string(state.save()).resources == RESOURCES
+
+    # non resource shaped values are kept as is
+    state = tf.TerraformState({"one": 2}, {})
+    assert state.resources == {"one": 2}
+
+
+def test_snapshot_roundtrip(tmpdir):
+    path = tmpdir.join("state.snapshot").strpath
+    write_snapshot(path, RESOURCES, {"url": {"value": "x"}})
+
+    resources, outputs = read_snapshot(path)
+    assert outputs == {"url": {"value": "x"}}
+    record = next(resources.records())
+    assert isinstance(record.blob, memoryview)
+    assert record.blob.readonly
+    assert resources == RESOURCES
+
+    state = tf.TerraformState.from_snapshot(path)
+    assert state["aws_sqs_queue.queue.tags"] == {"Environment": "production"}
+
+
+def test_snapshot_invalid(tmpdir):
+    path = tmpdir.join("state.snapshot")
+    path.write("{}")
+    with pytest.raises(tf.InvalidState):
+        tf.TerraformState.from_snapshot(path.strpath)
@@ -0,0 +1,72 @@
+from subprocess import CalledProcessError
+
+import pytest
+
+from pytest_terraform import tf
+from pytest_terraform.report import report
+from pytest_terraform.retry import RetryPolicy
+
+
+def test_retry_policy_transient():
+    delays = []
+    policy = RetryPolicy(attempts=2, base_delay=1, sleep=delays.append)
+    errors = [
+        CalledProcessError(1, "apply", output=b"Error: Throttling: Rate exceeded"),
+        CalledProcessError(1, "apply", output=b"read: connection reset by peer"),
+    ]
+
+    def func():
+        if errors:
+            raise errors.pop(0)
+        return "applied"
+
+    assert policy.call("apply", func) == "applied"
+    assert len(delays) == 2
+    assert 0.5 <= delays[0] <= 1 and 1 <= delays[1] <= 2
+
+
+def test_retry_policy_permanent():
+    delays = []
+    policy = RetryPolicy(sleep=delays.append)
+
+    def func():
+        raise CalledProcessError(1, "apply", output=b"Error: invalid reference")
+
+    with pytest.raises(CalledProcessError):
+        policy.call("apply", func)
+    assert delays == []
+
+
+def test_retry_policy_exhausted():
+    delays = []
+    policy = RetryPolicy(["busy"], attempts=1, sleep=delays.append)
+
+    def func():
+        raise CalledProcessError(1, "destroy", output=b"busy")
+
+    with pytest.raises(CalledProcessError):
+        policy.call("destroy", func)
+    assert len(delays) == 1
+
+
+def test_tf_runner_retry_apply(tmpdir, fake_terraform):
+    # the first apply fails with a transient error, the retry plans and
+    # applies again without a destroy in between.
+    stub = fake_terraform(
+        resources=[],
+        script=(
+            "if args[0] == 'apply' and calls.count('apply') == 1:\n"
+            "    print('Error: ThrottlingException: Rate exceeded')\n"
+            "    sys.exit(1)"
+        ),
+    )
+    trunner = tf.TerraformRunner(
+        tmpdir.mkdir("work").strpath,
+        tf_bin=stub.path,
+        stream_output=False,
+        retry_policy=RetryPolicy(attempts=1, sleep=lambda d: None),
+    )
+    retries = report.get("retries", "apply")
+    trunner.apply()
+    assert stub.calls() == ["plan", "apply", "plan", "apply"]
+    assert report.get("retries", "apply") == retries + 1
@@ -0,0 +1,71 @@
+import subprocess
+import sys
+
+# modules only needed once terraform runs, or with xdist distribution
+LazyModules = (
+    "concurrent.futures",
+    "jmespath",
+    "portalocker",
+    "pytest_terraform.snapshot",
+    "pytest_terraform.xdist",
+    "tarfile",
+)
+
+
+def plugin_modules():
+    # the modules in sys.modules after a fresh import of the plugin
+    return set(
+        subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                (
+                    "import sys; import pytest_terraform.plugin; "
+                    "print(' '.join(sys.modules))"
+                ),
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.split()
+    )
+
+
+def test_plugin_lazy_imports():
+    loaded = {
+        name
+        for name in plugin_modules()
+        if name in LazyModules or name.rpartition(".")[0] in LazyModules
+    }
+    assert loaded == set()
+
+
+def import_times():
+    # cumulative import time in microseconds per module, pytest imported
+    # first such that its cost isn't the plugin's
+    stderr = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            "import pytest; import pytest_terraform.plugin",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = [p.strip() for p in line[12:].split("|")]
+        if cumulative.isdigit():
+            times[name] = int(cumulative)
+    return times
+
+
+def test_plugin_import_time():
+    # relative to pytest's own import, generous to not depend on the host
+    times = import_times()
+    assert times["pytest_terraform.plugin"] < times["pytest"] / 2
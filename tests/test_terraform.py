@@ -9,7 +9,12 @@ from unittest.mock import MagicMock
 
 from subprocess import CalledProcessError
 from pytest_terraform import tf
-from pytest_terraform.exceptions import InvalidState
+from pytest_terraform.report import report
+from pytest_terraform.exceptions import (
+    InvalidState,
+    TerraformCommandFailed,
+    TerraformCommandTimeout,
+)
 
 
 def test_frame_walk():
@@ -303,3 +308,221 @@ def test_hook_modify_state_copy(testdir):
 
     state = tf.TerraformState.from_file(mod_dir / "local_buz" / "tf_resources.json")
     assert state["local_file.buz.content"] == "fiz!"
+
+
+def test_tf_runner_output_tail(tmpdir, fake_terraform):
+    tf_bin = fake_terraform(
+        script=(
+            "for i in range(5000): print('line %d' % i)\n"
+            "sys.stderr.write('boom\\n')\n"
+            "sys.exit(3)"
+        )
+    ).path
+    trunner = tf.TerraformRunner(tmpdir.strpath, tf_bin=tf_bin, stream_output=False)
+    trunner.output_tail_size = 1024
+
+    with pytest.raises(CalledProcessError) as excinfo:
+        trunner.init()
+
+    output = excinfo.value.output
+    assert excinfo.value.returncode == 3
+    assert len(output) <= 1024
+    assert output.endswith(b"line 4999\nboom\n")
+
+    err = TerraformCommandFailed.from_process_error(excinfo.value)
+    assert "exit code 3" in str(err)
+    assert str(err).endswith("boom\n")
+
+
+def test_tf_runner_show_stream(tmpdir, fake_terraform):
+    tf_bin = fake_terraform(script="sys.stderr.write('noise\\n')").path
+    trunner = tf.TerraformRunner(tmpdir.strpath, tf_bin=tf_bin)
+    assert trunner.show() == {"values": {"outputs": {}}}
+
+
+def test_tf_runner_show_failure(tmpdir, fake_terraform):
+    # nothing on stdout, the command's failure is raised, not a decode error
+    tf_bin = fake_terraform(script="sys.stderr.write('no state\\n')\nsys.exit(1)").path
+    trunner = tf.TerraformRunner(tmpdir.strpath, tf_bin=tf_bin)
+    with pytest.raises(CalledProcessError) as excinfo:
+        trunner.show()
+    assert excinfo.value.output == b"no state\n"
+
+
+def test_tf_runner_fast_destroy(tmpdir, fake_terraform):
+    stub = fake_terraform(log_args=True)
+    work_dir = tmpdir.mkdir("work")
+    state = {
+        "resources": [
+            {
+                "mode": "managed",
+                "type": "aws_sqs_queue",
+                "name": "queue",
+                "instances": [{"attributes": {"id": "q"}}],
+            }
+        ]
+    }
+    work_dir.join("..", "terraform.tfstate").write(json.dumps(state))
+    trunner = tf.TerraformRunner(work_dir.strpath, tf_bin=stub.path, fast_destroy=True)
+    trunner.destroy()
+    assert "-refresh=false -parallelism=30" in stub.calls()[0]
+
+
+@pytest.mark.parametrize("keep", (False, True))
+def test_tf_runner_fast_destroy_local(tmpdir, keep, fake_terraform):
+    tf_bin = fake_terraform(script="sys.exit(1)").path
+    work_dir = tmpdir.mkdir("work")
+    module_dir = tmpdir.mkdir("module")
+    module_dir.join("out.txt").write("x")
+    module_dir.join("config.json").write("{}")
+    state = {
+        "resources": [
+            {
+                "mode": "managed",
+                "type": "local_file",
+                "name": "out",
+                "instances": [{"attributes": {"id": "f", "filename": "out.txt"}}],
+            },
+            {
+                "mode": "data",
+                "type": "local_file",
+                "name": "config",
+                "instances": [{"attributes": {"id": "c", "filename": "config.json"}}],
+            },
+            {
+                "mode": "managed",
+                "type": "random_id",
+                "name": "rid",
+                "instances": [{"attributes": {"id": "r"}}],
+            },
+        ]
+    }
+    state_path = tmpdir.join("terraform.tfstate")
+    state_path.write(json.dumps(state))
+    trunner = tf.TerraformRunner(
+        work_dir.strpath,
+        module_dir=module_dir.strpath,
+        tf_bin=tf_bin,
+        fast_destroy=True,
+        prune=not keep,
+    )
+    trunner.destroy()
+    assert not state_path.exists()
+    assert not module_dir.join("out.txt").exists()
+    # files read by data sources aren't the module's to remove
+    assert module_dir.join("config.json").exists()
+    assert work_dir.exists() is keep
+
+
+def test_tf_runner_parallelism(tmpdir):
+    trunner = tf.TerraformRunner(tmpdir.strpath, tf_bin="terraform", parallelism=4)
+    assert "-parallelism=4" in trunner._get_cmd_args("apply", plan="tfplan")
+    assert "-parallelism=4" in trunner._get_cmd_args("plan", output="")
+    assert "-parallelism=4" in trunner._get_cmd_args("destroy")
+    assert "-parallelism=4" not in trunner._get_cmd_args("init", plugin_dir="")
+
+
+def test_tf_runner_timeout(tmpdir, fake_terraform):
+    # the stub ignores the interrupt, and is killed after the grace period
+    tf_bin = fake_terraform(
+        script=(
+            "import signal, time\n"
+            "signal.signal(signal.SIGINT, signal.SIG_IGN)\n"
+            "print('waiting', flush=True)\n"
+            "time.sleep(60)"
+        )
+    ).path
+    trunner = tf.TerraformRunner(
+        tmpdir.strpath, tf_bin=tf_bin, stream_output=False, timeouts={"init": 0.5}
+    )
+    trunner.kill_grace = 0.5
+
+    with pytest.raises(tf.CommandTimeout) as excinfo:
+        trunner.init()
+
+    err = TerraformCommandFailed.from_process_error(excinfo.value)
+    assert isinstance(err, TerraformCommandTimeout)
+    assert str(err).startswith("terraform command timed out after 0.5s")
+    assert str(err).endswith("waiting\n")
+
+
+def test_tf_runner_keyboard_interrupt(tmpdir, fake_terraform, monkeypatch):
+    # the stub traps the interrupt, logging it before exiting
+    stub = fake_terraform(
+        script=(
+            "import signal, time\n"
+            "def stop(*args):\n"
+            "    open(config['log'], 'a').write('interrupted\\n')\n"
+            "    sys.exit(1)\n"
+            "signal.signal(signal.SIGINT, stop)\n"
+            "print('applying', flush=True)\n"
+            "time.sleep(60)"
+        )
+    )
+
+    # a ctrl-c while the runner waits on terraform's output
+    def pump_output(self, stream, tail):
+        tail.write(stream.readline())
+        raise KeyboardInterrupt()
+
+    monkeypatch.setattr(tf.TerraformRunner, "_pump_output", pump_output)
+    trunner = tf.TerraformRunner(tmpdir.strpath, tf_bin=stub.path, stream_output=False)
+    trunner.kill_grace = 5
+
+    with pytest.raises(KeyboardInterrupt):
+        trunner.init()
+    assert stub.calls() == ["init", "interrupted"]
+
+
+@pytest.mark.parametrize(
+    "opt_in, environ, expected",
+    [(False, None, "None"), (True, None, "true"), (True, "false", "false")],
+)
+def test_tf_runner_break_lock_file(
+    tmpdir, fake_terraform, monkeypatch, opt_in, environ, expected
+):
+    stub = fake_terraform(log_env=[tf.BreakLockFileEnv])
+    if environ is None:
+        monkeypatch.delenv(tf.BreakLockFileEnv, raising=False)
+    else:
+        monkeypatch.setenv(tf.BreakLockFileEnv, environ)
+    tf.TerraformRunner(
+        tmpdir.strpath,
+        plugin_cache=tmpdir.join("cache").strpath,
+        tf_bin=stub.path,
+        stream_output=False,
+        break_lock_file=opt_in,
+    ).init()
+    assert stub.calls() == [f"init {tf.BreakLockFileEnv}={expected}"]
+
+
+def test_tf_runner_prune(tmpdir, fake_terraform):
+    # the stub writes state on apply, and a provider into the data dir
+    tf_bin = fake_terraform(
+        resources=[],
+        script=(
+            "if args[0] == 'apply':\n"
+            "    provider = os.path.join(os.environ['TF_DATA_DIR'], 'provider')\n"
+            "    open(provider, 'w').write('x')"
+        ),
+    ).path
+    module_dir = tmpdir.mkdir("module")
+    work_dir = tmpdir.mkdir("fixture0").mkdir("work")
+    trunner = tf.TerraformRunner(
+        work_dir.strpath,
+        module_dir=module_dir.strpath,
+        plugin_cache=tmpdir.join("cache").strpath,
+        tf_bin=tf_bin,
+        stream_output=False,
+        prune=True,
+    )
+    report.sections.clear()
+    trunner.apply(plan=False)
+    assert report.get("work dirs", "bytes written") > 0
+    assert report.get("work dirs", "peak bytes") > 0
+
+    trunner.destroy()
+    assert not tmpdir.join("fixture0").exists()
+    assert module_dir.exists()
+    assert report.get("work dirs", "pruned") == 1
+    report.sections.clear()
@@ -158,3 +158,77 @@ def test_tf_factory_teardown_config_default(_, frame_path_mock, fixture_call_moc
     df = tf.FixtureDecoratorFactory()
     df(terraform_dir="test")
     assert df._fixtures[0].teardown_config == tf.td.ON
+
+
+def test_tf_parallelism(tmpdir, monkeypatch):
+    fixture = tf.TerraformFixture(
+        tf_bin="fakebin",
+        plugin_cache="fakecache",
+        scope="function",
+        tf_root_module="fakeroot",
+        test_dir="fakedir",
+        replay=False,
+        teardown=tf.td.DEFAULT,
+        pytest_config=MagicMock(),
+        parallelism="auto",
+    )
+    # no recording uses terraform's default
+    assert fixture.get_parallelism(tmpdir) == tf.DefaultParallelism
+
+    state = tf.TerraformState(
+        {"aws_sqs_queue": {f"q{i}": {"id": str(i)} for i in range(100)}}, {}
+    )
+    state.save(tmpdir.join("tf_resources.json"))
+    assert fixture.get_parallelism(tmpdir) == tf.AutoParallelismBudget
+    monkeypatch.setenv("PYTEST_XDIST_WORKER_COUNT", "8")
+    assert fixture.get_parallelism(tmpdir) == tf.AutoParallelismBudget // 8
+
+    fixture.parallelism = 4
+    assert fixture.get_parallelism(tmpdir) == 4
+    fixture.parallelism = "zero"
+    with pytest.raises(tf.InvalidOption):
+        fixture.get_parallelism(tmpdir)
+
+
+@patch("pytest_terraform.tf.pytest")
+def test_tf_factory_index(_):
+    df = tf.FixtureDecoratorFactory()
+    df(terraform_dir="aws_sqs", scope="session")
+    df(terraform_dir="aws_sns")
+    assert df(terraform_dir="aws_sqs", scope="session") == df.nonce_decorator
+
+    assert [f.name for f in df.get_fixtures()] == ["aws_sqs", "aws_sns"]
+    assert df.get_fixture("aws_sqs").scope == "session"
+    assert df.get_fixture("aws_sqs").test_dir == tf.local(__file__).dirpath()
+    with pytest.raises(KeyError):
+        df.get_fixture("aws_sqs_dlq")
+    with pytest.raises(AssertionError):
+        df(terraform_dir="aws_sns", scope="session")
+
+
+def test_write_recording(tmpdir):
+    path = tmpdir.join("tf_resources.json")
+    volatile = tf.key_matcher(tf.DefaultVolatileKeys)
+    queue = {"id": "q", "tags": {"b": "2", "a": "1"}, "created_timestamp": "1"}
+    state = tf.TerraformState({"aws_sqs_queue": {"q": queue}}, {})
+    assert tf.write_recording(path, state.as_dict(), volatile)
+    recorded = path.read()
+    assert recorded.index('"a"') < recorded.index('"b"')
+
+    # only volatile values changed, the recording is left as is
+    path.setmtime(0)
+    queue = dict(queue, created_timestamp="2", tags={"a": "1", "b": "2"})
+    state = tf.TerraformState({"aws_sqs_queue": {"q": queue}}, {})
+    assert not tf.write_recording(path, state.as_dict(), volatile)
+    assert path.mtime() == 0
+
+    queue["tags"] = {"a": "3"}
+    state = tf.TerraformState({"aws_sqs_queue": {"q": queue}}, {})
+    assert tf.write_recording(path, state.as_dict(), volatile)
+    recorded = tf.TerraformState.from_file(str(path)).resources
+    assert recorded["aws_sqs_queue"]["q"] == {
+        "id": "q",
+        "tags": {"a": "3"},
+        "created_timestamp": "1",
+    }
+    assert tmpdir.listdir() == [path]
@@ -0,0 +1,21 @@
+import json
+
+from pytest_terraform.trace import Tracer
+
+
+def test_tracer(tmpdir):
+    path = tmpdir.join("trace.jsonl")
+    tracer = Tracer()
+    tracer.event("ignored")
+    assert not tracer.enabled
+
+    tracer.open(path.strpath, "gw1")
+    tracer.event("lock_wait", fixture="aws_sqs", duration=0.5)
+    with tracer.span("teardown", fixture="aws_sqs"):
+        pass
+    tracer.close()
+
+    events = [json.loads(line) for line in path.readlines()]
+    assert [e["event"] for e in events] == ["lock_wait", "teardown"]
+    assert {e["wid"] for e in events} == {"gw1"}
+    assert events[1]["fixture"] == "aws_sqs" and events[1]["duration"] >= 0
@@ -0,0 +1,132 @@
+from unittest.mock import MagicMock
+
+from pytest_terraform import tf, xdist
+
+
+def scoped_fixture(state_dir):
+    fixture = xdist.ScopedTerraformFixture(
+        tf_bin="fakebin",
+        plugin_cache="fakecache",
+        scope="session",
+        tf_root_module="fakeroot",
+        test_dir="fakedir",
+        replay=False,
+        teardown=tf.td.ON,
+        pytest_config=MagicMock(),
+    )
+    fixture.state_dir = state_dir
+    fixture.wid = "gw0"
+    fixture.runner = MagicMock()
+    fixture.runner.work_dir = "/tmp/work"
+    return fixture
+
+
+def test_scoped_create_publishes_snapshot(tmpdir):
+    fixture = scoped_fixture(tmpdir)
+    state = tf.TerraformState({"local_file": {"foo": {"id": "1"}}}, {"o": 1})
+    fixture.runner.apply.return_value = state
+
+    # hooks modifying the recorded state don't change the published state
+    def modify_state(tfstate):
+        tfstate.update(str(tfstate).replace('"1"', '"redacted"'))
+
+    fixture.config.hook.pytest_terraform_modify_state.side_effect = modify_state
+    test_api = fixture.create(MagicMock(), tmpdir)
+
+    assert tmpdir.join("fakeroot").read_text("utf8") == "/tmp/work"
+    published = tf.TerraformTestApi.from_snapshot(fixture.snapshot_path)
+    assert published.resources == test_api.resources
+    assert published["foo"] == "1"
+
+
+def test_scoped_create_loads_snapshot(tmpdir):
+    fixture = scoped_fixture(tmpdir)
+    tf.TerraformState({"local_file": {"foo": {"id": "1"}}}, {}).snapshot(
+        fixture.snapshot_path
+    )
+    tmpdir.join("fakeroot").write("/tmp/work")
+
+    test_api = fixture.create(MagicMock(), tmpdir)
+    fixture.runner.apply.assert_not_called()
+    assert isinstance(test_api, tf.TerraformTestApi)
+    assert test_api["foo"] == "1"
+
+
+def test_controller_provisioning(testdir, fake_terraform):
+    stub = fake_terraform(label="worker")
+    testdir.tmpdir.join("terraform", "local_a", "main.tf").ensure()
+    testdir.makepyfile(
+        """
+        from pytest_terraform import terraform
+
+        @terraform("local_a", scope="session", replay=False)
+        def test_a(local_a):
+            assert local_a["local_file.file.content"] == "recorded"
+
+        def test_b(local_a):
+            assert local_a["local_file.file.content"] == "recorded"
+
+        def test_c():
+            pass
+    """
+    )
+    result = testdir.runpytest_subprocess(
+        "-n",
+        "2",
+        f"--tf-binary={stub.path}",
+        "--tf-xdist-controller",
+    )
+    result.assert_outcomes(passed=3)
+    result.stdout.fnmatch_lines(["xdist: controller provisioned 1"])
+    assert stub.calls() == [
+        "controller init",
+        "controller plan",
+        "controller apply",
+        "controller destroy",
+    ]
+
+
+def test_controller_provisioning_failure(testdir, fake_terraform):
+    stub = fake_terraform(label="worker", fail=["local_a"])
+    testdir.tmpdir.join("terraform", "local_a", "main.tf").ensure()
+    testdir.makepyfile(
+        """
+        from pytest_terraform import terraform
+
+        @terraform("local_a", scope="session", replay=False)
+        def test_a(local_a):
+            pass
+    """
+    )
+    result = testdir.runpytest_subprocess(
+        "-n",
+        "2",
+        f"--tf-binary={stub.path}",
+        "--tf-xdist-controller",
+    )
+    result.assert_outcomes(errors=1)
+    # the output isn't streamed by the controller, only reported in the error
+    assert "Error: creating file: permission denied" not in result.outlines
+    result.stdout.fnmatch_lines(
+        ["*--- output tail ---*", "*Error: creating file: permission denied*"]
+    )
+
+
+def test_worker_tear_down_dependents_first(monkeypatch):
+    torn_down = []
+    fixtures = {}
+    for fixture_name in ("net", "app", "fn"):
+        fixture = MagicMock(fixture_name=fixture_name)
+        fixture.name = "local_" + fixture_name
+        fixture.tear_down.side_effect = lambda n=fixture.name: torn_down.append(n)
+        fixtures[fixture_name] = fixtures[fixture.name] = fixture
+    factory = MagicMock()
+    factory.get_fixture.side_effect = fixtures.get
+    factory.dependents.side_effect = {"net": ["app", "fn"], "app": [], "fn": []}.get
+    monkeypatch.setattr(tf, "terraform", factory)
+
+    # function scoped dependents aren't tracked, pytest tears them down
+    plugin = xdist.XDistTerraform.__new__(xdist.XDistTerraform)
+    plugin.tracked_fixtures = {"local_net", "local_app"}
+    plugin.tear_down("local_net")
+    assert torn_down == ["local_app", "local_net"]